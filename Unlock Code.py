@@ -1,6 +1,360 @@
+import os
+import sys
+import json
+import math
+import time
 import random
 import string
+import hashlib
+import argparse
 import itertools
+from collections import Counter
+
+from pronounceable import DEFAULT_CORPUS, MARKOV_ORDER, MarkovModel, PronounceableGenerator, default_model
+
+
+# ==================== МАСКИ И ПРАВИЛА ВОССТАНОВЛЕНИЯ ====================
+
+MASK_CLASSES = {
+    'l': string.ascii_lowercase,
+    'u': string.ascii_uppercase,
+    'd': string.digits,
+    's': "!@#$%^&*()_+-=[]{}|;:,.<>?",
+}
+MASK_CLASSES['a'] = MASK_CLASSES['l'] + MASK_CLASSES['u'] + MASK_CLASSES['d'] + MASK_CLASSES['s']
+MASK_SPECIAL = "?[]{}"
+
+LEET_MAP = {'e': '3', 'E': '3', 'a': '@', 'A': '@', 'i': '1', 'I': '1', 'o': '0', 'O': '0', 's': '$', 'S': '$'}
+LEET_TABLE = str.maketrans(LEET_MAP)
+
+# Однозначные правила — те же преобразования, что и в боте (transform_password)
+RULE_OPS = {
+    ':': lambda s: s,
+    'l': str.lower,
+    'u': str.upper,
+    'c': str.capitalize,
+    'a': lambda s: ''.join(c.upper() if i % 2 == 0 else c.lower() for i, c in enumerate(s)),
+    'r': lambda s: s[::-1],
+    'e': lambda s: s.translate(LEET_TABLE),
+}
+MAX_SUFFIX_DIGITS = 8
+MAX_DEDUP_CANDIDATES = 1_000_000  # словарных вариантов в памяти для отсева повторов (~100 МБ)
+DEFAULT_RULES = (':', 'c', 'u', 'a', 'r', 'e', 'E', 'ce', 'd1', 'd2', 'cd2', 'cEd2', 'd4', 'cd4')
+
+
+class MaskPattern:
+    """Маска: ?l ?u ?d ?s ?a, ?1-?4 — свои наборы, [a-z0-9] — набор на месте, {...} — необязательные позиции.
+
+    ?? ?[ ?] ?{ ?} — сами символы. Маска компилируется в детерминированный автомат:
+    каждый вариант — ровно один путь, поэтому перебор идет без повторов и без памяти под них,
+    а число вариантов считается точно, без перебора.
+    """
+
+    def __init__(self, mask: str, custom_sets=None):
+        self.mask = mask
+        self.custom_sets = {str(i + 1): s for i, s in enumerate(custom_sets or [])}
+        self.positions = self._parse(mask)  # [(символы, необязательная)]
+        n = len(self.positions)
+        # Замыкание по пропускам: из позиции i можно сразу оказаться в i+1, i+2... пока позиции необязательные
+        self._closure = [0] * (n + 1)
+        for i in range(n, -1, -1):
+            self._closure[i] = 1 << i
+            if i < n and self.positions[i][1]:
+                self._closure[i] |= self._closure[i + 1]
+        self._accept = 1 << n
+        self._start = self._closure[0]
+        self._edges = {}  # состояние автомата -> {символ: следующее состояние}
+        self._keyspace = None
+
+    def _parse(self, mask: str):
+        positions, optional, i = [], False, 0
+        while i < len(mask):
+            ch = mask[i]
+            if ch == '{':
+                if optional:
+                    raise ValueError("Вложенные {} не поддерживаются")
+                optional, i = True, i + 1
+                continue
+            if ch == '}':
+                if not optional:
+                    raise ValueError("Лишняя }")
+                optional, i = False, i + 1
+                continue
+            if ch == '?':
+                if i + 1 >= len(mask):
+                    raise ValueError("Маска не может заканчиваться на ?")
+                code = mask[i + 1]
+                if code in MASK_CLASSES:
+                    chars = MASK_CLASSES[code]
+                elif code in self.custom_sets:
+                    chars = self.custom_sets[code]
+                elif code in MASK_SPECIAL:
+                    chars = code
+                else:
+                    raise ValueError(f"Неизвестный класс ?{code}")
+                i += 2
+            elif ch == '[':
+                end = i + 1
+                while end < len(mask) and mask[end] != ']':
+                    end += 2 if mask[end] == '?' else 1
+                if end >= len(mask):
+                    raise ValueError("Незакрытая [")
+                chars, i = self._parse_set(mask[i + 1:end]), end + 1
+            elif ch == ']':
+                raise ValueError("Лишняя ]")
+            else:
+                chars, i = ch, i + 1
+            chars = ''.join(dict.fromkeys(chars))
+            if not chars:
+                raise ValueError("Пустой набор символов")
+            positions.append((chars, optional))
+        if optional:
+            raise ValueError("Незакрытая {")
+        return positions
+
+    @staticmethod
+    def _parse_set(body: str) -> str:
+        chars, i = [], 0
+        while i < len(body):
+            if body[i] == '?' and i + 1 < len(body):
+                chars.append(body[i + 1])
+                i += 2
+            elif i + 2 < len(body) and body[i + 1] == '-':
+                chars.extend(chr(c) for c in range(ord(body[i]), ord(body[i + 2]) + 1))
+                i += 3
+            else:
+                chars.append(body[i])
+                i += 1
+        return ''.join(chars)
+
+    def _step(self, state: int) -> dict:
+        edges = self._edges.get(state)
+        if edges is None:
+            edges = {}
+            for i, (chars, _) in enumerate(self.positions):
+                if state >> i & 1:
+                    for ch in chars:
+                        edges[ch] = edges.get(ch, 0) | self._closure[i + 1]
+            self._edges[state] = edges
+        return edges
+
+    def keyspace(self) -> int:
+        """Точное число различных вариантов"""
+        if self._keyspace is None:
+            if not any(optional for _, optional in self.positions):
+                total = 1
+                for chars, _ in self.positions:
+                    total *= len(chars)
+            else:
+                # Считаем пути автомата по длинам: число состояний мало, перебора вариантов нет
+                layer = {self._start: 1}
+                total = 1 if self._start & self._accept else 0
+                while layer:
+                    next_layer = {}
+                    for state, count in layer.items():
+                        for target in self._step(state).values():
+                            next_layer[target] = next_layer.get(target, 0) + count
+                    total += sum(count for state, count in next_layer.items() if state & self._accept)
+                    layer = next_layer
+            self._keyspace = total
+        return self._keyspace
+
+    def matches(self, candidate: str) -> bool:
+        state = self._start
+        for ch in candidate:
+            state = self._step(state).get(ch)
+            if state is None:
+                return False
+        return bool(state & self._accept)
+
+    def __iter__(self):
+        if not any(optional for _, optional in self.positions):
+            return map(''.join, itertools.product(*(chars for chars, _ in self.positions)))
+        return self._walk()
+
+    def _walk(self):
+        # Обход автомата в глубину: память — O(длины маски)
+        if self._start & self._accept:
+            yield ""
+        prefix = []
+        stack = [iter(self._step(self._start).items())]
+        while stack:
+            for ch, target in stack[-1]:
+                prefix.append(ch)
+                if target & self._accept:
+                    yield ''.join(prefix)
+                edges = self._step(target)
+                if edges:
+                    stack.append(iter(edges.items()))
+                    break
+                prefix.pop()
+            else:
+                stack.pop()
+                if prefix:
+                    prefix.pop()
+
+
+class RuleSet:
+    """Правила видоизменения слов, применяются слева направо: 'c', 'cE', 'ed2', 'r:'...
+
+    : без изменений, l/u — нижний/верхний регистр, c — с заглавной, a — чередование регистра,
+    r — наоборот, e — leet целиком, E — все варианты частичного leet, dN — суффикс из N цифр.
+    """
+
+    def __init__(self, rule: str):
+        self.rule = rule
+        self.ops = []
+        i = 0
+        while i < len(rule):
+            op = rule[i]
+            if op == 'd':
+                end = i + 1
+                while end < len(rule) and rule[end].isdigit():
+                    end += 1
+                if end == i + 1 or not 1 <= int(rule[i + 1:end]) <= MAX_SUFFIX_DIGITS:
+                    raise ValueError(f"Правило d требует число цифр 1-{MAX_SUFFIX_DIGITS}: {rule}")
+                self.ops.append(('d', int(rule[i + 1:end])))
+                i = end
+                continue
+            if op != 'E' and op not in RULE_OPS:
+                raise ValueError(f"Неизвестное правило '{op}' в '{rule}'")
+            self.ops.append((op, None))
+            i += 1
+        if sum(op == 'E' for op, _ in self.ops) > 1:
+            raise ValueError(f"Правило E допускается один раз: {rule}")
+
+    def count(self, word: str) -> int:
+        """Точное число вариантов для слова (без перебора)"""
+        total = 1
+        for op, arg in self.ops:
+            if op == 'E':
+                # Цифры и leet-замены не бывают буквами, поэтому k не зависит от выбранного пути
+                total *= 2 ** sum(ch in LEET_MAP for ch in word)
+            elif op == 'd':
+                total *= 10 ** arg
+                word += '0' * arg
+            else:
+                word = RULE_OPS[op](word)
+        return total
+
+    def apply(self, word: str):
+        variants = iter((word,))
+        for op, arg in self.ops:
+            if op == 'E':
+                variants = _leet_variants(variants)
+            elif op == 'd':
+                variants = _digit_suffixes(variants, arg)
+            else:
+                variants = map(RULE_OPS[op], variants)
+        return variants
+
+
+def _leet_variants(words):
+    for word in words:
+        choices = [(ch, LEET_MAP[ch]) if ch in LEET_MAP else (ch,) for ch in word]
+        yield from map(''.join, itertools.product(*choices))
+
+
+def _digit_suffixes(words, digits: int):
+    suffixes = range(10 ** digits)
+    for word in words:
+        for number in suffixes:
+            yield f"{word}{number:0{digits}d}"
+
+
+class WordRuleSource:
+    """Слова (или пары слов из двух словарей) с правилами"""
+
+    def __init__(self, words, rules=(':',)):
+        self.words = list(dict.fromkeys(w for w in words if w))
+        self.rules = [RuleSet(r) for r in rules]
+
+    @classmethod
+    def combinator(cls, left, right, separators=('',), rules=(':',)):
+        """Все сочетания левое + разделитель + правое"""
+        left, right = list(dict.fromkeys(left)), list(dict.fromkeys(right))
+        return cls((l + sep + r for l in left for sep in separators for r in right), rules)
+
+    def keyspace(self) -> int:
+        return sum(rule.count(word) for word in self.words for rule in self.rules)
+
+    def __iter__(self):
+        for word in self.words:
+            for rule in self.rules:
+                yield from rule.apply(word)
+
+
+class CandidateStream:
+    """Ленивый поток кандидатов из масок и словарей без повторов.
+
+    Варианты масок не запоминаются: совпадения с более ранними масками проверяются автоматом.
+    В памяти держатся только варианты словарных источников, не больше max_seen: после этого
+    новые варианты не запоминаются, и повторы между словарными источниками возможны.
+    """
+
+    def __init__(self, max_seen: int = MAX_DEDUP_CANDIDATES):
+        self.max_seen = max_seen
+        self.sources = []
+        self.emitted = 0
+        self.duplicates = 0
+
+    def add_mask(self, mask: str, custom_sets=None) -> "CandidateStream":
+        self.sources.append(MaskPattern(mask, custom_sets))
+        return self
+
+    def add_words(self, words, rules=(':',)) -> "CandidateStream":
+        self.sources.append(WordRuleSource(words, rules))
+        return self
+
+    def add_combinator(self, left, right, separators=('',), rules=(':',)) -> "CandidateStream":
+        self.sources.append(WordRuleSource.combinator(left, right, separators, rules))
+        return self
+
+    def keyspace(self) -> int:
+        """Точное число генерируемых вариантов до удаления повторов между источниками"""
+        return sum(source.keyspace() for source in self.sources)
+
+    def __iter__(self):
+        seen = set()
+        earlier_masks = []
+        for source in self.sources:
+            is_mask = isinstance(source, MaskPattern)
+            for candidate in source:
+                if candidate in seen or any(mask.matches(candidate) for mask in earlier_masks):
+                    self.duplicates += 1
+                    continue
+                if not is_mask and len(seen) < self.max_seen:
+                    seen.add(candidate)
+                self.emitted += 1
+                yield candidate
+            if is_mask:
+                earlier_masks.append(source)
+
+
+class HashTarget:
+    """Проверка кандидатов по известным хешам (без соли): md5, sha1, sha256, sha512..."""
+
+    def __init__(self, digests, algorithm: str = "sha256"):
+        algorithm = algorithm.lower()
+        if algorithm not in hashlib.algorithms_available or algorithm.startswith('shake'):
+            raise ValueError(f"Неподдерживаемый алгоритм: {algorithm}")
+        self.algorithm = algorithm
+        self._hash = getattr(hashlib, algorithm, None) or (lambda data: hashlib.new(algorithm, data))
+        self.targets = {bytes.fromhex(d.strip()) for d in digests if d.strip()}
+        self.checked = 0
+
+    def find(self, candidates, encoding: str = "utf-8"):
+        """Пары (кандидат, hex-хеш) для найденных целей; перебор останавливается, когда найдены все"""
+        remaining = set(self.targets)
+        hash_func = self._hash
+        for candidate in candidates:
+            self.checked += 1
+            digest = hash_func(candidate.encode(encoding)).digest()
+            if digest in remaining:
+                remaining.discard(digest)
+                yield candidate, digest.hex()
+                if not remaining:
+                    return
 
 
 class AdvancedPasswordGenerator:
@@ -62,15 +416,61 @@ class AdvancedPasswordGenerator:
         print(f"🔹 Ваш пароль: {password}")
 
     def mode3_password_recovery(self):
-        """Режим 3: Восстановление пароля по известным частям"""
+        """Режим 3: Восстановление пароля по шаблону, маске или известным словам"""
         print("\n=== РЕЖИМ 3: Восстановление пароля ===")
+        print("1 - Шаблон с ? на месте неизвестных символов")
+        print("2 - Маска (?l ?u ?d ?s ?a, [abc], {?d} - необязательная позиция)")
+        print("3 - Известные слова + правила (регистр, leet, реверс, цифры в конце)")
+
+        kind = input("Выберите способ (1-3): ")
+        stream = CandidateStream()
+        try:
+            if kind == "1":
+                if not self._add_template(stream):
+                    return
+            elif kind == "2":
+                mask = input("Введите маску: ")
+                custom_sets = input("Свои наборы для ?1-?4 через пробел (Enter - без них): ").split()
+                stream.add_mask(mask, custom_sets)
+            elif kind == "3":
+                words = input("Введите слова, из которых мог состоять пароль (через пробел): ").split()
+                if not words:
+                    print("❌ Нужно ввести хотя бы одно слово!")
+                    return
+                rules = input(f"Правила через пробел (Enter - {' '.join(DEFAULT_RULES)}): ").split() or DEFAULT_RULES
+                stream.add_words(words, rules)
+                second = input("Вторые части для сочетаний слово+слово (Enter - без них): ").split()
+                if second:
+                    stream.add_combinator(words, second, ('', '_', '.', '-'), rules)
+            else:
+                print("❌ Неверный выбор!")
+                return
+        except ValueError as e:
+            print(f"❌ {e}")
+            return
+
+        print(f"\n📊 Всего вариантов: {stream.keyspace():,}".replace(',', ' '))
+        target = input("Хеш пароля для проверки (Enter - просто показать варианты): ").strip()
+        if target:
+            self._check_hash(stream, target)
+            return
+
+        print("\n🔍 Возможные пароли:")
+        found_count = 0
+        for found_count, password in enumerate(itertools.islice(stream, 10), 1):
+            print(f"Вариант {found_count}: {password}")
+
+        if found_count == 0:
+            print("❌ Не удалось найти подходящие пароли!")
 
+    def _add_template(self, stream):
+        """Прежний режим: шаблон с ? и один набор символов для всех неизвестных позиций"""
         length = int(input("Введите длину пароля: "))
         known_parts = input("Введите известные части пароля (используйте ? для неизвестных символов): ")
 
         if len(known_parts) != length:
             print(f"❌ Длина должна быть {length} символов!")
-            return
+            return False
 
         # Определяем какие символы можно использовать
         print("Какие символы могут быть в пароле?")
@@ -91,29 +491,35 @@ class AdvancedPasswordGenerator:
             possible_chars = self.lowercase + self.uppercase + self.digits + self.symbols
         else:
             print("❌ Неверный выбор!")
-            return
+            return False
 
-        # Генерируем несколько возможных вариантов
-        print("\n🔍 Возможные пароли:")
-        found_count = 0
-
-        for i in range(1000):  # Ограничим количество попыток
-            password = []
-            for char in known_parts:
-                if char == '?':
-                    password.append(random.choice(possible_chars))
-                else:
-                    password.append(char)
+        mask = ''.join('?1' if ch == '?' else '?' + ch if ch in MASK_SPECIAL else ch for ch in known_parts)
+        stream.add_mask(mask, [possible_chars])
+        return True
 
-            result = ''.join(password)
-            print(f"Вариант {found_count + 1}: {result}")
-            found_count += 1
+    def _check_hash(self, stream, target):
+        algorithm = input("Алгоритм хеша (md5/sha1/sha256/sha512, Enter - sha256): ").strip() or "sha256"
+        try:
+            checker = HashTarget([target], algorithm)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return
 
-            if found_count >= 5:  # Покажем только 5 вариантов
+        print("⏳ Перебор... (Ctrl+C - остановить)")
+        started = time.perf_counter()
+        found = None
+        try:
+            for found, _ in checker.find(stream):
                 break
+        except KeyboardInterrupt:
+            print("⏹ Перебор остановлен")
+        elapsed = max(time.perf_counter() - started, 1e-9)
 
-        if found_count == 0:
-            print("❌ Не удалось найти подходящие пароли!")
+        if found is not None:
+            print(f"✅ Пароль найден: {found}")
+        else:
+            print("❌ Пароль не найден среди вариантов")
+        print(f"Проверено: {checker.checked} за {elapsed:.1f} с ({checker.checked / elapsed:,.0f} в секунду)".replace(',', ' '))
 
     def show_menu(self):
         """Главное меню программы"""
@@ -123,7 +529,7 @@ class AdvancedPasswordGenerator:
             print("=" * 50)
             print("1 - Случайный пароль (простой/сложный)")
             print("2 - Пароль из своих символов")
-            print("3 - Восстановление пароля по шаблону")
+            print("3 - Восстановление пароля (шаблон, маска, слова + правила)")
             print("0 - Выход")
             print("=" * 50)
 
@@ -142,7 +548,307 @@ class AdvancedPasswordGenerator:
                 print("❌ Неверный выбор! Попробуйте снова.")
 
 
-# Запуск программы
+# ==================== КОМАНДНАЯ СТРОКА ====================
+# python "Unlock Code.py" generate -n 10000000 | ...
+# cat passwords.txt | python "Unlock Code.py" analyze --json
+# python "Unlock Code.py" recover --mask "Pass?d?d{?s}" --hash <sha256>
+
+CLI_BATCH = 16384  # паролей за одну запись в stdout
+
+POLICIES = {  # политика -> (набор символов, длина по умолчанию)
+    'simple': (MASK_CLASSES['l'] + MASK_CLASSES['u'], 10),
+    'strong': (MASK_CLASSES['a'], 16),
+    'alnum': (MASK_CLASSES['l'] + MASK_CLASSES['u'] + MASK_CLASSES['d'], 12),
+    'digits': (MASK_CLASSES['d'], 6),
+}
+PASSPHRASE_WORDS = {
+    'ru': ["река", "солнце", "гора", "лес", "ветер", "океан", "звезда", "луна",
+           "книга", "город", "дом", "свет", "тень", "путь", "мечта", "утро"],
+    'en': ["river", "sun", "mountain", "forest", "wind", "ocean", "star", "moon",
+           "book", "city", "home", "light", "shadow", "path", "dream", "morning"],
+}
+PASSPHRASE_SEPARATORS = ["-", "_", ".", ""]
+STRENGTH_LABELS = {0: "❌ Очень слабый", 1: "🔴 Слабый", 2: "🟡 Средний", 3: "🟢 Хороший", 4: "💪 Отличный", 5: "🔐 Идеальный"}
+
+
+def random_indices(n: int, count: int) -> bytes:
+    """count равномерных значений 0..n-1 (n ≤ 256) из os.urandom; лишние байты отбраковываются без смещения"""
+    limit = 256 - 256 % n  # байты выше limit отбрасываются, иначе младшие значения выпадали бы чаще
+    table = bytes(b % n for b in range(256))
+    rejected = bytes(range(limit, 256))
+    result = b''
+    while len(result) < count:
+        result += os.urandom((count - len(result)) * 256 // limit + 64).translate(table, rejected)
+    return result[:count]
+
+
+def random_password_blocks(charset: str, length: int, count: int, batch: int = CLI_BATCH):
+    """Блоки паролей (bytes, по строке на пароль) из os.urandom"""
+    alphabet = ''.join(dict.fromkeys(charset))
+    if not alphabet.isascii() or len(alphabet) > 256:
+        # Не-ASCII символы не ложатся в один байт — медленный, но честный путь
+        rng = random.SystemRandom()
+        while count > 0:
+            size = min(batch, count)
+            yield ''.join(''.join(rng.choices(alphabet, k=length)) + '\n' for _ in range(size)).encode('utf-8')
+            count -= size
+        return
+
+    to_chars = bytes(ord(alphabet[i % len(alphabet)]) for i in range(256))
+    while count > 0:
+        size = min(batch, count)
+        chunk = random_indices(len(alphabet), size * length).translate(to_chars)
+        # Раскладка по столбцам: length срезов на пачку вместо среза на каждый пароль
+        block = bytearray(b'\n' * (size * (length + 1)))
+        for column in range(length):
+            block[column::length + 1] = chunk[column::length]
+        yield bytes(block)
+        count -= size
+
+
+def analyze_password(password: str) -> dict:
+    """Та же оценка, что в режиме анализа и в боте: баллы 0-5 и энтропия по уникальным символам"""
+    length = len(password)
+    contains = {
+        'lowercase': any(c in MASK_CLASSES['l'] for c in password),
+        'uppercase': any(c in MASK_CLASSES['u'] for c in password),
+        'digits': any(c in MASK_CLASSES['d'] for c in password),
+        'symbols': any(c in MASK_CLASSES['s'] for c in password),
+    }
+    score = (2 if length >= 12 else 1 if length >= 8 else 0) + sum(contains.values())
+    unique = len(set(password))
+    return {
+        'length': length,
+        'score': min(score, 5),
+        'strength': STRENGTH_LABELS[min(score, 5)],
+        'entropy': round(length * math.log2(unique), 2) if unique else 0.0,
+        'contains': contains,
+    }
+
+
+def iter_input_lines(sources):
+    """Строки из аргументов или из stdin ('-' или без аргументов) — по одной, без чтения всего потока"""
+    if sources and sources != ['-']:
+        yield from sources
+        return
+    for line in sys.stdin:
+        line = line.rstrip('\r\n')
+        if line:
+            yield line
+
+
+def read_words(path: str):
+    stream = sys.stdin if path == '-' else open(path, encoding='utf-8', errors='replace')
+    try:
+        return [line.strip() for line in stream if line.strip()]
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def write_lines(lines, batch: int = CLI_BATCH):
+    """Построчный вывод пачками: память ограничена размером пачки"""
+    out = sys.stdout.buffer
+    for block in iter(lambda: list(itertools.islice(lines, batch)), []):
+        out.write(('\n'.join(block) + '\n').encode('utf-8'))
+
+
+def cli_generate(args) -> int:
+    charset, default_length = POLICIES[args.policy]
+    if args.charset:
+        charset = args.charset
+    length = args.length if args.length is not None else default_length
+    if length < 1 or args.count < 0:
+        print("❌ Длина и количество должны быть положительными", file=sys.stderr)
+        return 2
+    out = sys.stdout.buffer
+    for block in random_password_blocks(charset, length, args.count):
+        out.write(block)
+    return 0
+
+
+def cli_analyze(args) -> int:
+    summary = Counter()
+    results = (analyze_password(password) | {'password': password}
+               for password in iter_input_lines(args.passwords))
+
+    def render():
+        for result in results:
+            summary[result['strength']] += 1
+            if args.no_password:
+                result.pop('password')
+            if args.json:
+                yield json.dumps(result, ensure_ascii=False)
+            else:
+                row = [str(result['length']), f"{result['entropy']:.2f}", str(result['score']), result['strength']]
+                yield '\t'.join(row if args.no_password else [result['password']] + row)
+
+    write_lines(render())
+    if args.summary:
+        for strength, count in sorted(summary.items(), key=lambda item: -item[1]):
+            print(f"{strength}: {count}", file=sys.stderr)
+    return 0
+
+
+def cli_recover(args) -> int:
+    stream = CandidateStream()
+    try:
+        for mask in args.mask:
+            stream.add_mask(mask, args.custom_set)
+        if args.words:
+            words = read_words(args.words)
+            stream.add_words(words, args.rules)
+            if args.combine:
+                stream.add_combinator(words, read_words(args.combine), args.separators, args.rules)
+        if not stream.sources:
+            print("❌ Укажите --mask и/или --words", file=sys.stderr)
+            return 2
+        checker = HashTarget(args.hash, args.algorithm) if args.hash else None
+    except (ValueError, OSError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+
+    if args.keyspace:
+        print(stream.keyspace())
+        return 0
+    if checker is None:
+        write_lines(iter(stream))
+        return 0
+
+    found = 0
+    for candidate, digest in checker.find(stream):
+        print(f"{digest}\t{candidate}", flush=True)
+        found += 1
+    print(f"Проверено {checker.checked} из {stream.keyspace()}, найдено {found} из {len(checker.targets)}",
+          file=sys.stderr)
+    return 0 if found else 1
+
+
+def cli_passphrase(args) -> int:
+    rng = random.SystemRandom()
+    if args.words < 1 or args.count < 0:
+        print("❌ Число слов и количество должны быть положительными", file=sys.stderr)
+        return 2
+    words = PASSPHRASE_WORDS[args.lang]
+    if args.wordlist:
+        try:
+            words = read_words(args.wordlist)
+        except OSError as e:
+            print(f"❌ Не удалось прочитать словарь: {e}", file=sys.stderr)
+            return 2
+        if not words:
+            print("❌ Словарь пуст", file=sys.stderr)
+            return 2
+
+    def phrases():
+        remaining = args.count
+        while remaining > 0:
+            size = min(CLI_BATCH, remaining)
+            remaining -= size
+            # Случайные индексы пачкой: по системному вызову на пачку, а не на каждое слово
+            if len(words) <= 256:
+                picks = random_indices(len(words), size * args.words)
+                chosen = [words[i] for i in picks]
+            else:
+                chosen = rng.choices(words, k=size * args.words)
+            if args.caps:
+                chosen = [w.capitalize() if flip else w for w, flip in zip(chosen, random_indices(2, len(chosen)))]
+            separators = (random_indices(len(PASSPHRASE_SEPARATORS), size) if args.separator is None
+                          else itertools.repeat(None, size))
+            for i, separator in enumerate(separators):
+                separator = PASSPHRASE_SEPARATORS[separator] if args.separator is None else args.separator
+                phrase = separator.join(chosen[i * args.words:(i + 1) * args.words])
+                if args.numbers:
+                    number = str(rng.randint(10, 999))
+                    phrase += rng.choice([number, f"-{number}", f"_{number}"])
+                yield phrase
+
+    write_lines(phrases())
+    return 0
+
+
+def cli_pronounceable(args) -> int:
+    try:
+        model = MarkovModel(read_words(args.wordlist), args.order) if args.wordlist else (
+            default_model() if args.order == MARKOV_ORDER else MarkovModel(DEFAULT_CORPUS, args.order))
+        generator = PronounceableGenerator(model)
+        passwords = generator.batch(args.count, args.length, args.digits, args.symbol)
+        write_lines(f"{password}\t{bits:.1f}" if args.entropy else password for password, bits in passwords)
+    except (ValueError, OSError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+    return 0
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="unlockcode", description="Unlock Code — генерация, анализ и восстановление паролей. "
+                                                                   "Без аргументов запускается интерактивное меню.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="Случайные пароли, по одному в строке")
+    generate.add_argument("-n", "--count", type=int, default=1)
+    generate.add_argument("-l", "--length", type=int, default=None, help="По умолчанию — длина политики")
+    generate.add_argument("-p", "--policy", choices=sorted(POLICIES), default="strong")
+    generate.add_argument("-c", "--charset", default=None, help="Свой набор символов вместо набора политики")
+    generate.set_defaults(handler=cli_generate)
+
+    analyze = commands.add_parser("analyze", help="Оценка паролей из аргументов или stdin (TSV или JSON Lines)")
+    analyze.add_argument("passwords", nargs="*", help="Пароли; без аргументов или '-' — читать stdin")
+    analyze.add_argument("--json", action="store_true", help="JSON Lines вместо TSV")
+    analyze.add_argument("--no-password", action="store_true", help="Не выводить сами пароли")
+    analyze.add_argument("--summary", action="store_true", help="Итог по уровням сложности в stderr")
+    analyze.set_defaults(handler=cli_analyze)
+
+    recover = commands.add_parser("recover", help="Кандидаты по маскам и словам с правилами, поиск по хешу")
+    recover.add_argument("-m", "--mask", action="append", default=[], help="Маска: ?l ?u ?d ?s ?a ?1-?4 [abc] {?d}")
+    recover.add_argument("-s", "--custom-set", action="append", default=[], help="Набор для ?1, ?2... по порядку")
+    recover.add_argument("-w", "--words", default=None, help="Файл со словами ('-' — stdin)")
+    recover.add_argument("-r", "--rules", nargs="+", default=list(DEFAULT_RULES), help="Правила: : l u c a r e E dN")
+    recover.add_argument("--combine", default=None, help="Второй файл слов для сочетаний слово+слово")
+    recover.add_argument("--separators", nargs="+", default=['', '_', '.', '-'])
+    recover.add_argument("--hash", action="append", default=[], help="Искомый хеш (можно несколько)")
+    recover.add_argument("-a", "--algorithm", default="sha256")
+    recover.add_argument("--keyspace", action="store_true", help="Только вывести точное число вариантов")
+    recover.set_defaults(handler=cli_recover)
+
+    passphrase = commands.add_parser("passphrase", help="Пасфразы из словаря")
+    passphrase.add_argument("-n", "--count", type=int, default=1)
+    passphrase.add_argument("-k", "--words", type=int, default=4, help="Слов в пасфразе")
+    passphrase.add_argument("--lang", choices=sorted(PASSPHRASE_WORDS), default="en")
+    passphrase.add_argument("--wordlist", default=None, help="Свой словарь, слово в строке")
+    passphrase.add_argument("--separator", default=None, help="По умолчанию — случайный из - _ . и пустого")
+    passphrase.add_argument("--numbers", action="store_true", help="Добавить число в конце")
+    passphrase.add_argument("--caps", action="store_true", help="Случайные слова с заглавной")
+    passphrase.set_defaults(handler=cli_passphrase)
+
+    pronounceable = commands.add_parser("pronounceable", help="Произносимые пароли по цепи Маркова")
+    pronounceable.add_argument("-n", "--count", type=int, default=1)
+    pronounceable.add_argument("-l", "--length", type=int, default=16, help="Полная длина, включая цифры и символ")
+    pronounceable.add_argument("-d", "--digits", type=int, default=2, help="Цифр в конце")
+    pronounceable.add_argument("--symbol", action="store_true", help="Спецсимвол в конце")
+    pronounceable.add_argument("--wordlist", default=None, help="Свой словарь для обучения, слово в строке")
+    pronounceable.add_argument("--order", type=int, default=MARKOV_ORDER, help="Длина контекста цепи")
+    pronounceable.add_argument("--entropy", action="store_true", help="Выводить точную энтропию (бит) через TAB")
+    pronounceable.set_defaults(handler=cli_pronounceable)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_arg_parser().parse_args(argv)
+    try:
+        return args.handler(args)
+    except BrokenPipeError:
+        # Читатель закрыл канал (например, | head): тихо завершаемся, как обычные утилиты
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 0
+    except KeyboardInterrupt:
+        return 130
+
+
+# Запуск программы: с аргументами — командная строка, без них — интерактивное меню
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(main())
     generator = AdvancedPasswordGenerator()
     generator.show_menu()
\ No newline at end of file
@@ -1,19 +1,47 @@
 import os
+import io
+import re
+import csv
+import sys
 import json
+import base64
+import asyncio
+import argparse
+import getpass
+import secrets
+import signal
+import shlex
+import queue
+import tempfile
+import threading
+import atexit
+import multiprocessing
+from array import array
 import random
 import string
 import math
 import hashlib
 import hmac
+import zlib
 import struct
 import time
-from datetime import datetime
-from collections import Counter
-from typing import Dict, List, Optional
+import heapq
+from bisect import bisect_left
+from itertools import islice
+from datetime import datetime, date, timedelta
+from collections import Counter, OrderedDict, deque
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs, quote, urlencode
 import logging
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
+from telegram import Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle, InputTextMessageContent
+from telegram.constants import MessageLimit
+from telegram.ext import (Application, BaseUpdateProcessor, CommandHandler, CallbackQueryHandler, InlineQueryHandler,
+                          MessageHandler, filters, ContextTypes)
+from telegram.helpers import escape_markdown
+
+from qrrender import QR_AVAILABLE, qr_renderer, wifi_payload
+from pronounceable import PronounceableGenerator
 
 # Настройка логирования
 logging.basicConfig(
@@ -22,6 +50,330 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# ==================== БЛОКИРОВКИ ФАЙЛОВ ====================
+
+class UserFileLock:
+    """Межпроцессная рекомендательная блокировка файлов одного пользователя"""
+
+    POLL_INTERVAL = 0.01
+
+    def __init__(self, user_id: int = None, storage_dir: str = "user_data"):
+        os.makedirs(storage_dir, exist_ok=True)
+        self.path = os.path.join(storage_dir, f".lock_{user_id if user_id else 'default'}")
+        self._fd = None
+
+    def try_acquire(self) -> bool:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def acquire(self, timeout: float = 30.0) -> bool:
+        deadline = time.monotonic() + timeout
+        while not self.try_acquire():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(self.POLL_INTERVAL)
+        return True
+
+    async def acquire_async(self, timeout: float = 30.0) -> bool:
+        # Опрос без блокировки event loop
+        deadline = time.monotonic() + timeout
+        while not self.try_acquire():
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(self.POLL_INTERVAL)
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            if fcntl:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        if not self.acquire():
+            raise TimeoutError(f"Не удалось захватить блокировку {self.path}")
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def write_json_atomic(path: str, data):
+    """Запись JSON через временный файл, чтобы другие процессы не видели файл наполовину записанным"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+# ==================== ШИФРОВАНИЕ ХРАНИЛИЩА ====================
+
+VAULT_FORMAT = "unlockcode-vault/1"
+VAULT_SESSION_TTL = int(os.getenv("VAULT_SESSION_TTL", "900"))  # секунд бездействия до блокировки
+VAULT_SECRET_FIELDS = ('login', 'password', 'notes', 'totp')
+
+
+class VaultCrypto:
+    """Аутентифицированное шифрование отдельных записей (encrypt-then-MAC на stdlib)"""
+
+    NONCE_SIZE = 16
+    TAG_SIZE = 32
+
+    def __init__(self, master_key: bytes):
+        # Раздельные подключи для шифрования и MAC выводятся один раз на сессию
+        self.enc_key = hmac.new(master_key, b"unlockcode-enc", hashlib.sha256).digest()
+        self.mac_key = hmac.new(master_key, b"unlockcode-mac", hashlib.sha256).digest()
+
+    @staticmethod
+    def new_kdf_params() -> Dict:
+        """Параметры KDF для нового ключа (scrypt, либо PBKDF2 если scrypt недоступен)"""
+        salt = os.urandom(16).hex()
+        if hasattr(hashlib, 'scrypt'):
+            return {'name': 'scrypt', 'salt': salt, 'n': 2 ** 14, 'r': 8, 'p': 1}
+        return {'name': 'pbkdf2', 'salt': salt, 'iterations': 600_000}
+
+    @staticmethod
+    def derive_key(master_password: str, kdf: Dict) -> bytes:
+        """Вывод мастер-ключа из мастер-пароля"""
+        secret = master_password.encode('utf-8')
+        salt = bytes.fromhex(kdf['salt'])
+        if kdf['name'] == 'scrypt':
+            return hashlib.scrypt(secret, salt=salt, n=kdf['n'], r=kdf['r'], p=kdf['p'], dklen=32)
+        return hashlib.pbkdf2_hmac('sha256', secret, salt, kdf['iterations'], dklen=32)
+
+    def _xor_keystream(self, nonce: bytes, data: bytes) -> bytes:
+        # Поток ключа: keyed BLAKE2b в режиме счётчика
+        blocks = [
+            hashlib.blake2b(nonce + struct.pack('>Q', counter), key=self.enc_key, digest_size=64).digest()
+            for counter in range((len(data) + 63) // 64)
+        ]
+        stream = b''.join(blocks)[:len(data)]
+        return (int.from_bytes(data, 'big') ^ int.from_bytes(stream, 'big')).to_bytes(len(data), 'big')
+
+    def _tag(self, nonce: bytes, aad: bytes, ciphertext: bytes) -> bytes:
+        return hmac.new(self.mac_key, nonce + struct.pack('>I', len(aad)) + aad + ciphertext,
+                        hashlib.sha256).digest()
+
+    def seal(self, plaintext: bytes, aad: bytes = b"") -> str:
+        """Шифрование с привязкой к дополнительным данным (например, имени сервиса)"""
+        nonce = os.urandom(self.NONCE_SIZE)
+        ciphertext = self._xor_keystream(nonce, plaintext)
+        token = nonce + ciphertext + self._tag(nonce, aad, ciphertext)
+        return base64.urlsafe_b64encode(token).decode('ascii')
+
+    def open(self, token: str, aad: bytes = b"") -> Optional[bytes]:
+        """Расшифровка; None если ключ неверный или запись повреждена"""
+        try:
+            raw = base64.urlsafe_b64decode(token.encode('ascii'))
+        except (ValueError, UnicodeEncodeError):
+            return None
+        if len(raw) < self.NONCE_SIZE + self.TAG_SIZE:
+            return None
+        nonce, ciphertext, tag = raw[:self.NONCE_SIZE], raw[self.NONCE_SIZE:-self.TAG_SIZE], raw[-self.TAG_SIZE:]
+        if not hmac.compare_digest(tag, self._tag(nonce, aad, ciphertext)):
+            return None
+        return self._xor_keystream(nonce, ciphertext)
+
+
+class VaultKeyCache:
+    """Кэш ключей хранилищ в памяти, ключ истекает после периода бездействия"""
+
+    def __init__(self, ttl: int = VAULT_SESSION_TTL):
+        self.ttl = ttl
+        self._entries = {}  # storage_file -> (VaultCrypto, момент истечения)
+        self._lock = threading.Lock()  # вывод ключа и перешифрование идут в потоках
+
+    def get(self, name: str) -> Optional[VaultCrypto]:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                return None
+            crypto, expires_at = entry
+            now = time.monotonic()
+            if now >= expires_at:
+                del self._entries[name]
+                return None
+            self._entries[name] = (crypto, now + self.ttl)
+            return crypto
+
+    def put(self, name: str, crypto: VaultCrypto):
+        now = time.monotonic()
+        with self._lock:
+            # Попутно вычищаем истекшие сессии, чтобы кэш не рос
+            for key in [k for k, (_, expires_at) in self._entries.items() if expires_at <= now]:
+                del self._entries[key]
+            self._entries[name] = (crypto, now + self.ttl)
+
+    def drop(self, name: str):
+        with self._lock:
+            self._entries.pop(name, None)
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return list(self._entries)
+
+    def take(self, name: str) -> Optional[Tuple[VaultCrypto, float]]:
+        """Забрать ключ вместе с оставшимся временем сессии (для передачи другому воркеру)"""
+        with self._lock:
+            entry = self._entries.pop(name, None)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0], entry[1] - time.monotonic()
+
+    def adopt(self, name: str, crypto: VaultCrypto, ttl_left: float):
+        with self._lock:
+            self._entries[name] = (crypto, time.monotonic() + ttl_left)
+
+
+vault_keys = VaultKeyCache()
+
+# ==================== ПОИСК ПО СЕРВИСАМ ====================
+
+SEARCH_INDEX_CACHE_SIZE = 256  # сколько пользовательских индексов держать в памяти
+
+
+class LRUCache:
+    """Небольшой LRU-кэш с ограничением числа элементов"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key, default=None):
+        if key not in self._items:
+            return default
+        self._items.move_to_end(key)
+        return self._items[key]
+
+    def put(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def pop(self, key, default=None):
+        return self._items.pop(key, default)
+
+
+class ServiceIndex:
+    """Индекс имён сервисов: префиксный поиск по отсортированному массиву и нечёткий по триграммам"""
+
+    MAX_FUZZY_CANDIDATES = 300
+    MIN_FUZZY_SCORE = 0.3
+
+    def __init__(self, services=()):
+        # Отсортированный массив (нормализованное имя, имя) играет роль сжатого префиксного дерева
+        self._sorted = sorted((self._normalize(name), name) for name in services)
+        self._trigrams = {}
+        for key, name in self._sorted:
+            self._index_trigrams(key, name)
+
+    def __len__(self):
+        return len(self._sorted)
+
+    @staticmethod
+    def _normalize(name: str) -> str:
+        return name.casefold().strip()
+
+    @staticmethod
+    def _grams(key: str) -> set:
+        padded = f"  {key} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def _index_trigrams(self, key: str, name: str):
+        for gram in self._grams(key):
+            self._trigrams.setdefault(gram, set()).add(name)
+
+    def add(self, name: str):
+        entry = (self._normalize(name), name)
+        pos = bisect_left(self._sorted, entry)
+        if pos < len(self._sorted) and self._sorted[pos] == entry:
+            return
+        self._sorted.insert(pos, entry)
+        self._index_trigrams(entry[0], name)
+
+    def remove(self, name: str):
+        entry = (self._normalize(name), name)
+        pos = bisect_left(self._sorted, entry)
+        if pos == len(self._sorted) or self._sorted[pos] != entry:
+            return
+        del self._sorted[pos]
+        for gram in self._grams(entry[0]):
+            postings = self._trigrams.get(gram)
+            if postings is not None:
+                postings.discard(name)
+                if not postings:
+                    del self._trigrams[gram]
+
+    def page(self, offset: int, limit: int) -> List[str]:
+        return [name for _, name in self._sorted[offset:offset + limit]]
+
+    def prefix(self, query: str, limit: int = 10) -> List[str]:
+        key = self._normalize(query)
+        pos = bisect_left(self._sorted, (key,))
+        results = []
+        while pos < len(self._sorted) and len(results) < limit and self._sorted[pos][0].startswith(key):
+            results.append(self._sorted[pos][1])
+            pos += 1
+        return results
+
+    def fuzzy(self, query: str, limit: int = 10) -> List[str]:
+        grams = self._grams(self._normalize(query))
+        postings = sorted((self._trigrams[g] for g in grams if g in self._trigrams), key=len)
+        if not postings:
+            return []
+
+        # Кандидаты берутся из самых редких триграмм, чтобы частые ("com", "mai") не раздували перебор
+        candidates = set()
+        for names in postings:
+            if candidates and len(candidates) + len(names) > self.MAX_FUZZY_CANDIDATES:
+                break
+            candidates.update(islice(names, self.MAX_FUZZY_CANDIDATES))
+
+        # Коэффициент Дайса; число триграмм имени равно длине нормализованного имени + 1
+        scored = []
+        for name in candidates:
+            common = sum(1 for names in postings if name in names)
+            score = 2 * common / (len(grams) + len(self._normalize(name)) + 1)
+            if score >= self.MIN_FUZZY_SCORE:
+                scored.append((score, name))
+        return [name for _, name in heapq.nlargest(limit, scored)]
+
+    def search(self, query: str, limit: int = 8) -> List[str]:
+        """Ранжированный поиск: сначала совпадения по префиксу, затем похожие имена"""
+        results = self.prefix(query, limit)
+        if len(results) < limit:
+            found = set(results)
+            results += [name for name in self.fuzzy(query, limit) if name not in found][:limit - len(results)]
+        return results
+
+
+service_indexes = LRUCache(SEARCH_INDEX_CACHE_SIZE)
+
 # ==================== КЛАСС МЕНЕДЖЕРА ПАРОЛЕЙ ====================
 
 class PasswordManager:
@@ -30,20 +382,28 @@ class PasswordManager:
         self.storage_dir = "user_data"
         os.makedirs(self.storage_dir, exist_ok=True)
         self.storage_file = f"{self.storage_dir}/passwords_{user_id}.json" if user_id else "passwords.json"
+        self.vault_header = None  # параметры KDF и проверочный блок, если хранилище зашифровано
+        self._signature = None  # (mtime_ns, размер) прочитанного файла — версия для кэша индекса
         self.passwords = self.load_passwords()
 
     def load_passwords(self) -> Dict:
         if os.path.exists(self.storage_file):
             try:
                 with open(self.storage_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                    st = os.fstat(f.fileno())
+                    self._signature = (st.st_mtime_ns, st.st_size)
+                    data = json.load(f)
             except:
                 return {}
+            if isinstance(data, dict) and data.get('format') == VAULT_FORMAT:
+                self.vault_header = {'kdf': data['kdf'], 'check': data['check']}
+                return data.get('records', {})
+            return data
         return {}
 
     def save_password(self, service: str, login: str, password: str, notes: str = "") -> bool:
         try:
-            self.passwords[service] = {
+            record = {
                 'login': login,
                 'password': password,
                 'notes': notes,
@@ -51,20 +411,64 @@ class PasswordManager:
                 'strength': self._calculate_strength(password),
                 'last_used': datetime.now().isoformat()
             }
+            if self.is_encrypted():
+                crypto = self._crypto()
+                if crypto is None:
+                    return False
+                record = self._seal_record(service, record, crypto)
+            index = self._cached_index()
+            self.passwords[service] = record
+            if index is not None:
+                index.add(service)
             self._save_to_file()
             return True
         except:
             return False
 
-    def get_password(self, service: str) -> Optional[Dict]:
-        if service in self.passwords:
-            self.passwords[service]['last_used'] = datetime.now().isoformat()
+    def save_passwords_bulk(self, entries: Dict[str, Dict]) -> bool:
+        """Сохранение множества записей за одну запись файла"""
+        if self.is_locked():
+            return False
+        crypto = self._crypto()
+        index = self._cached_index()
+        now = datetime.now().isoformat()
+        for service, data in entries.items():
+            record = {
+                'login': data['login'],
+                'password': data['password'],
+                'notes': data.get('notes', ""),
+                'created': data.get('created') or now,
+                'strength': data.get('strength') or self._calculate_strength(data['password']),
+                'last_used': now
+            }
+            self.passwords[service] = self._seal_record(service, record, crypto) if crypto else record
+            if index is not None:
+                index.add(service)
+        self._save_to_file()
+        return True
+
+    def get_password(self, service: str, touch: bool = True) -> Optional[Dict]:
+        record = self.passwords.get(service)
+        if record is None:
+            return None
+        if self.is_encrypted():
+            crypto = self._crypto()
+            data = self._open_record(service, record, crypto) if crypto else None
+            if data is None:
+                return None
+        else:
+            data = record
+        if touch:
+            record['last_used'] = data['last_used'] = datetime.now().isoformat()
             self._save_to_file()
-        return self.passwords.get(service)
+        return data
 
     def delete_password(self, service: str) -> bool:
         if service in self.passwords:
+            index = self._cached_index()
             del self.passwords[service]
+            if index is not None:
+                index.remove(service)
             self._save_to_file()
             return True
         return False
@@ -72,6 +476,110 @@ class PasswordManager:
     def list_services(self) -> List[str]:
         return list(self.passwords.keys())
 
+    def set_totp(self, service: str, totp_uri: str) -> bool:
+        """Привязка TOTP-секрета (otpauth://-URI) к сохраненному сервису"""
+        data = self.get_password(service, touch=False)
+        if data is None:
+            return False
+        data = dict(data, totp=totp_uri)
+        crypto = self._crypto()
+        self.passwords[service] = self._seal_record(service, data, crypto) if crypto else data
+        self._save_to_file()
+        return True
+
+    def totp_uris(self) -> Dict[str, str]:
+        """TOTP-URI всех сервисов, у которых они есть; расшифровываются только такие записи"""
+        uris = {}
+        for service, record in self.passwords.items():
+            if record.get('totp') or record.get('has_totp'):
+                data = self.get_password(service, touch=False)
+                if data and data.get('totp'):
+                    uris[service] = data['totp']
+        return uris
+
+    def search_index(self) -> ServiceIndex:
+        """Индекс имён сервисов, общий для всех экземпляров менеджера этого хранилища"""
+        index = self._cached_index()
+        if index is None:
+            index = ServiceIndex(self.passwords)
+            service_indexes.put(self.storage_file, (self._signature, index))
+        return index
+
+    def _cached_index(self) -> Optional[ServiceIndex]:
+        # Индекс поддерживается инкрементально и привязан к версии файла: после записи
+        # другим процессом (импорт, другой воркер) он перестраивается
+        entry = service_indexes.get(self.storage_file)
+        if entry is not None and entry[0] == self._signature and len(entry[1]) == len(self.passwords):
+            return entry[1]
+        return None
+
+    def is_encrypted(self) -> bool:
+        return self.vault_header is not None
+
+    def is_locked(self) -> bool:
+        return self.is_encrypted() and self._crypto() is None
+
+    def unlock(self, master_password: str) -> bool:
+        """Вывод ключа из мастер-пароля; ключ кэшируется на сессию"""
+        if not self.is_encrypted():
+            return False
+        crypto = VaultCrypto(VaultCrypto.derive_key(master_password, self.vault_header['kdf']))
+        if crypto.open(self.vault_header['check'], b"check") is None:
+            return False
+        vault_keys.put(self.storage_file, crypto)
+        return True
+
+    def lock(self):
+        vault_keys.drop(self.storage_file)
+
+    def rotate_key(self, new_master_password: str) -> bool:
+        """Перешифрование всех записей новым ключом (включение шифрования или смена мастер-пароля)"""
+        old_crypto = self._crypto()
+        if self.is_encrypted() and old_crypto is None:
+            return False
+
+        opened = {}
+        for service, record in self.passwords.items():
+            data = self._open_record(service, record, old_crypto) if old_crypto else record
+            if data is None:
+                logger.error(f"Запись '{service}' повреждена, смена ключа отменена")
+                return False
+            opened[service] = data
+
+        kdf = VaultCrypto.new_kdf_params()
+        crypto = VaultCrypto(VaultCrypto.derive_key(new_master_password, kdf))
+        self.passwords = {service: self._seal_record(service, data, crypto) for service, data in opened.items()}
+        self.vault_header = {'kdf': kdf, 'check': crypto.seal(b"unlockcode", b"check")}
+        vault_keys.put(self.storage_file, crypto)
+        self._save_to_file()
+        return True
+
+    def _crypto(self) -> Optional[VaultCrypto]:
+        return vault_keys.get(self.storage_file) if self.is_encrypted() else None
+
+    def _seal_record(self, service: str, data: Dict, crypto: VaultCrypto) -> Dict:
+        # Метаданные остаются открытыми (для проверки сроков и статистики), секреты шифруются
+        record = {k: v for k, v in data.items() if k not in VAULT_SECRET_FIELDS}
+        record['has_totp'] = bool(data.get('totp'))
+        secret = {k: data.get(k, "") for k in VAULT_SECRET_FIELDS}
+        record['sealed'] = crypto.seal(json.dumps(secret, ensure_ascii=False).encode('utf-8'),
+                                       service.encode('utf-8'))
+        return record
+
+    def _open_record(self, service: str, record: Dict, crypto: VaultCrypto) -> Optional[Dict]:
+        plaintext = crypto.open(record.get('sealed', ""), service.encode('utf-8'))
+        if plaintext is None:
+            return None
+        data = {k: v for k, v in record.items() if k != 'sealed'}
+        data.update(json.loads(plaintext.decode('utf-8')))
+        return data
+
+    _LOWER = frozenset(string.ascii_lowercase)
+    _UPPER = frozenset(string.ascii_uppercase)
+    _DIGITS = frozenset(string.digits)
+    _SYMBOLS = frozenset("!@#$%^&*()_+-=[]{}|;:,.<>?")
+    _STRENGTH_LEVELS = ["Очень слабый", "Слабый", "Средний", "Хороший", "Отличный", "Идеальный"]
+
     def _calculate_strength(self, password: str) -> str:
         score = 0
         if len(password) >= 12:
@@ -79,37 +587,470 @@ class PasswordManager:
         elif len(password) >= 8:
             score += 1
 
-        if any(c in string.ascii_lowercase for c in password):
-            score += 1
-        if any(c in string.ascii_uppercase for c in password):
-            score += 1
-        if any(c in string.digits for c in password):
-            score += 1
-        if any(c in "!@#$%^&*()_+-=[]{}|;:,.<>?" for c in password):
-            score += 1
+        chars = set(password)
+        for char_class in (self._LOWER, self._UPPER, self._DIGITS, self._SYMBOLS):
+            if not chars.isdisjoint(char_class):
+                score += 1
 
-        strength_levels = ["Очень слабый", "Слабый", "Средний", "Хороший", "Отличный", "Идеальный"]
-        return strength_levels[min(score, 5)]
+        return self._STRENGTH_LEVELS[min(score, 5)]
 
     def _save_to_file(self):
+        if self.is_encrypted():
+            data = {'format': VAULT_FORMAT, **self.vault_header, 'records': self.passwords}
+        else:
+            data = self.passwords
         try:
-            with open(self.storage_file, 'w', encoding='utf-8') as f:
-                json.dump(self.passwords, f, ensure_ascii=False, indent=2)
+            write_json_atomic(self.storage_file, data)
+            st = os.stat(self.storage_file)
         except Exception as e:
             logger.error(f"Ошибка сохранения: {e}")
+            return
+        # Индекс уже обновлен вместе с записью — переносим его на новую версию файла
+        entry = service_indexes.get(self.storage_file)
+        signature, self._signature = self._signature, (st.st_mtime_ns, st.st_size)
+        if entry is not None and entry[0] == signature:
+            service_indexes.put(self.storage_file, (self._signature, entry[1]))
+
+# ==================== TOTP (RFC 6238) ====================
+
+TOTP_CACHE_SIZE = int(os.getenv("TOTP_CACHE_SIZE", "100000"))  # секретов с предвычисленным состоянием
+
+
+class TotpEngine:
+    """Пакетный расчет TOTP-кодов: HMAC-ключи готовятся один раз, коды мемоизируются на окно"""
+
+    ALGORITHMS = {'SHA1': hashlib.sha1, 'SHA256': hashlib.sha256, 'SHA512': hashlib.sha512}
+
+    def __init__(self, cache_size: int = TOTP_CACHE_SIZE):
+        # sha256(URI) -> [HMAC с уже обработанным ключом, цифр, период, последний счетчик, последний код]
+        self._states = LRUCache(cache_size)
+
+    @staticmethod
+    def decode_secret(secret: str) -> bytes:
+        secret = secret.replace(' ', '').replace('-', '').upper()
+        return base64.b32decode(secret + '=' * (-len(secret) % 8))
+
+    @classmethod
+    def build_uri(cls, service: str, secret_or_uri: str) -> str:
+        """Нормализация base32-секрета или otpauth://-URI; ValueError если секрет некорректен"""
+        if secret_or_uri.startswith('otpauth://'):
+            cls._parse(secret_or_uri)
+            return secret_or_uri
+        secret = secret_or_uri.replace(' ', '').replace('-', '').upper()
+        if not secret:
+            raise ValueError("Пустой секрет")
+        cls.decode_secret(secret)
+        return f"otpauth://totp/{quote(service)}?" + urlencode({'secret': secret, 'issuer': 'UnlockCode'})
+
+    @classmethod
+    def _parse(cls, uri: str) -> Tuple[bytes, int, int, str]:
+        parts = urlsplit(uri)
+        if parts.scheme != 'otpauth' or parts.netloc != 'totp':
+            raise ValueError("Поддерживаются только otpauth://totp/ URI")
+        params = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        algorithm = params.get('algorithm', 'SHA1').upper()
+        if algorithm not in cls.ALGORITHMS or 'secret' not in params:
+            raise ValueError("Некорректный TOTP URI")
+        digits, period = int(params.get('digits', 6)), int(params.get('period', 30))
+        if not 6 <= digits <= 10 or period <= 0:
+            raise ValueError("TOTP: digits должно быть от 6 до 10, period — больше нуля")
+        return cls.decode_secret(params['secret']), digits, period, algorithm
+
+    def _state(self, uri: str) -> list:
+        # URI содержит секрет, поэтому в ключах кэша хранится только его хэш
+        cache_key = hashlib.sha256(uri.encode('utf-8')).digest()
+        state = self._states.get(cache_key)
+        if state is None:
+            key, digits, period, algorithm = self._parse(uri)
+            state = [hmac.new(key, digestmod=self.ALGORITHMS[algorithm]), digits, period, -1, ""]
+            self._states.put(cache_key, state)
+        return state
+
+    def code(self, uri: str, now: float = None) -> Tuple[str, int]:
+        """Текущий код и секунды до смены"""
+        now = time.time() if now is None else now
+        state = self._state(uri)
+        template, digits, period, last_counter, last_code = state
+        counter = int(now // period)
+        if counter != last_counter:
+            mac = template.copy()
+            mac.update(struct.pack('>Q', counter))
+            digest = mac.digest()
+            offset = digest[-1] & 0x0F
+            value = struct.unpack('>I', digest[offset:offset + 4])[0] & 0x7FFFFFFF
+            state[3], state[4] = counter, str(value % 10 ** digits).zfill(digits)
+        return state[4], int(period - now % period)
+
+    def codes(self, uris: Dict[str, str], now: float = None) -> Dict[str, Tuple[str, int]]:
+        """Коды для всех сервисов пользователя за один проход"""
+        now = time.time() if now is None else now
+        result = {}
+        for service, uri in uris.items():
+            try:
+                result[service] = self.code(uri, now)
+            except Exception as e:  # одна испорченная запись не должна ломать /codes для всего хранилища
+                logger.warning(f"Некорректный TOTP для '{service}': {e}")
+        return result
+
+
+totp_engine = TotpEngine()
+
+# ==================== ИМПОРТ ПАРОЛЕЙ ====================
+
+IMPORT_MAX_FILE_SIZE = 20 * 1024 * 1024  # лимит скачивания файлов Bot API
+
+
+class PasswordImporter:
+    """Потоковый импорт экспортов Chrome / Firefox / Bitwarden (CSV и JSON)"""
+
+    # Соответствие колонок CSV полям записи
+    CSV_COLUMNS = {
+        'chrome': {'service': 'name', 'url': 'url', 'login': 'username', 'password': 'password', 'notes': 'note'},
+        'firefox': {'url': 'url', 'login': 'username', 'password': 'password'},
+        'bitwarden': {'service': 'name', 'url': 'login_uri', 'login': 'login_username',
+                      'password': 'login_password', 'notes': 'notes'},
+    }
+    MAX_FIELD_LENGTH = 1024
+    CHUNK_SIZE = 1 << 16
+
+    def __init__(self, manager: PasswordManager):
+        self.manager = manager
+
+    def import_file(self, path: str, fmt: str = "auto") -> Dict:
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            return self.import_stream(f, fmt)
+
+    def import_stream(self, stream, fmt: str = "auto") -> Dict:
+        """Разбор, проверка и дедупликация записей с одной записью хранилища в конце"""
+        report = {'format': fmt, 'imported': 0, 'duplicates': 0, 'invalid': 0, 'renamed': 0}
+        if self.manager.is_locked():
+            report['error'] = 'locked'
+            return report
+
+        if fmt == "auto":
+            fmt = self.detect_format(stream)
+            report['format'] = fmt
+
+        entries = {}
+        strength_cache = {}
+        for service, login, password, notes in self.iter_records(stream, fmt):
+            if not service or not password or max(len(service), len(login), len(password), len(notes)) > self.MAX_FIELD_LENGTH:
+                report['invalid'] += 1
+                continue
+            key = self._resolve_service_name(service, login, password, entries)
+            if key is None:
+                report['duplicates'] += 1
+                continue
+            if key != service:
+                report['renamed'] += 1
+            strength = strength_cache.get(password)
+            if strength is None:
+                strength = strength_cache[password] = self.manager._calculate_strength(password)
+            entries[key] = {'login': login, 'password': password, 'notes': notes, 'strength': strength}
+
+        if entries and not self.manager.save_passwords_bulk(entries):
+            report['error'] = 'save'
+            return report
+        report['imported'] = len(entries)
+        return report
+
+    @classmethod
+    def detect_format(cls, stream) -> str:
+        """Определение формата по заголовку, не теряя прочитанных данных"""
+        head = stream.read(4096)
+        stream.seek(0)
+        stripped = head.lstrip()
+        if stripped.startswith('{'):
+            return 'bitwarden_json' if '"items"' in head else 'json'
+        if stripped.startswith('['):
+            # Корневой список есть и у Bitwarden, и у экспорта UnlockCode — различаем по первой записи:
+            # у Bitwarden login — объект, у UnlockCode — строка. Запись читается потоково, даже если она длинная
+            try:
+                first = next(cls._iter_json_items(stream), None)
+            except json.JSONDecodeError:
+                first = None
+            stream.seek(0)
+            return 'bitwarden_json' if first and isinstance(first.get('login'), dict) else 'json'
+        header = next(csv.reader(io.StringIO(head)), [])
+        if 'login_password' in header:
+            return 'bitwarden'
+        if 'httpRealm' in header or 'guid' in header:
+            return 'firefox'
+        return 'chrome'
+
+    def iter_records(self, stream, fmt: str) -> Iterator[Tuple[str, str, str, str]]:
+        """Ленивая выдача (сервис, логин, пароль, заметки)"""
+        if fmt == 'bitwarden_json':
+            for item in self._iter_json_items(stream):
+                login = item.get('login') or {}
+                if item.get('type', 1) != 1 or not isinstance(login, dict):
+                    continue
+                uris = login.get('uris') or [{}]
+                service = item.get('name') or self._service_from_url(uris[0].get('uri') or "")
+                yield self._clean(service, login.get('username'), login.get('password'), item.get('notes'))
+        elif fmt == 'json':
+            # Собственный формат UnlockCode: {сервис: {login, password, notes}} или список записей с полем service
+            data = json.load(stream)
+            if isinstance(data, list):
+                for record in data:
+                    if isinstance(record, dict):
+                        yield self._clean(record.get('service') or record.get('name'), record.get('login'),
+                                          record.get('password'), record.get('notes'))
+                return
+            if not isinstance(data, dict):
+                raise ValueError("Корень JSON должен быть объектом или списком записей")
+            if data.get('format') == VAULT_FORMAT:
+                raise ValueError("Зашифрованное хранилище нельзя импортировать")
+            for service, record in data.items():
+                if isinstance(record, dict):
+                    yield self._clean(service, record.get('login'), record.get('password'), record.get('notes'))
+        else:
+            columns = self.CSV_COLUMNS.get(fmt, self.CSV_COLUMNS['chrome'])
+            for row in csv.DictReader(stream):
+                service = row.get(columns.get('service', ''), "") or self._service_from_url(row.get(columns['url']) or "")
+                yield self._clean(service, row.get(columns['login']), row.get(columns['password']),
+                                  row.get(columns.get('notes', ''), ""))
+
+    @classmethod
+    def _iter_json_items(cls, stream) -> Iterator[Dict]:
+        # Потоковый разбор массива items (или корневого массива) без загрузки всего файла
+        decoder = json.JSONDecoder()
+        start = re.compile(r'^\s*\[|"items"\s*:\s*\[')
+        buf = ""
+        while True:
+            match = start.search(buf)
+            if match:
+                buf = buf[match.end():]
+                break
+            chunk = stream.read(cls.CHUNK_SIZE)
+            if not chunk:
+                return
+            buf = buf[-64:] + chunk if buf.strip() else buf + chunk
+
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buf) and buf[pos] == ']':
+                return
+            try:
+                if pos >= len(buf):
+                    raise json.JSONDecodeError("need more data", buf, pos)
+                item, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                chunk = stream.read(cls.CHUNK_SIZE)
+                if not chunk:
+                    if buf[pos:].strip():
+                        raise
+                    return
+                buf, pos = buf[pos:] + chunk, 0
+                continue
+            if isinstance(item, dict):
+                yield item
+            if pos > cls.CHUNK_SIZE:
+                buf, pos = buf[pos:], 0
+
+    @staticmethod
+    def _service_from_url(url: str) -> str:
+        host = urlsplit(url if '://' in url else f"//{url}").hostname or ""
+        return host[4:] if host.startswith('www.') else host
+
+    @staticmethod
+    def _clean(service, login, password, notes) -> Tuple[str, str, str, str]:
+        return (str(service or "").strip(), str(login or "").strip(), str(password or ""),
+                str(notes or "").strip())
+
+    def _resolve_service_name(self, service: str, login: str, password: str, entries: Dict) -> Optional[str]:
+        """Свободное имя для записи; None, если такая же запись уже есть в импорте или хранилище"""
+        # Несколько аккаунтов одного сервиса сохраняются под уточнёнными именами
+        base = f"{service} ({login})" if login else service
+        candidates = [service, base]
+        suffix = 2
+        while True:
+            for name in candidates:
+                if name in entries:
+                    existing = entries[name]
+                elif name in self.manager.passwords:
+                    existing = self.manager.get_password(name, touch=False) or {}
+                else:
+                    return name
+                if existing.get('login') == login and existing.get('password') == password:
+                    return None
+            candidates = [f"{base} #{suffix}"]
+            suffix += 1
+
+# ==================== ГЛОБАЛЬНАЯ СТАТИСТИКА ====================
+
+ROLLUP_FLUSH_INTERVAL = float(os.getenv("ROLLUP_FLUSH_INTERVAL", "30"))  # секунд между записями на диск
+ROLLUP_USER_DAYS = int(os.getenv("ROLLUP_USER_DAYS", "7"))  # дней, за которые хранятся множества пользователей
+ADMIN_IDS = {int(x) for x in os.getenv("TELEGRAM_ADMIN_IDS", "").split(",") if x.strip().isdigit()}
+
+
+class UsageRollup:
+    """Посуточные счетчики генераций по режимам и активных пользователей для всего бота"""
+
+    def __init__(self, shard: str = "main", storage_dir: str = "user_data"):
+        self.shard = shard  # у каждого процесса свой файл, при запросе файлы суммируются
+        self.storage_dir = storage_dir
+        self.epoch = None
+        self.modes = {}  # режим -> array('I') счетчиков по дням от epoch
+        self.users = array('I')  # число пользователей по дням в этом процессе
+        self.day_users = {}  # день -> множество пользователей за последние ROLLUP_USER_DAYS дней
+        self._loaded = False
+        self._dirty = False
+        self._last_flush = time.monotonic()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.storage_dir, f"rollup_{self.shard}.json")
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        data = self._read(self.path)
+        self.epoch = date.fromisoformat(data['epoch']) if data else date.today()
+        if data:
+            self.modes = {mode: array('I', counts) for mode, counts in data['modes'].items()}
+            self.users = array('I', data['users'])
+            self.day_users = self._day_sets(data)
+
+    @staticmethod
+    def _day_sets(data: Dict) -> Dict[int, set]:
+        if 'day_users' in data:
+            return {int(day): set(ids) for day, ids in data['day_users'].items()}
+        # Формат до хранения множеств за несколько дней
+        if 'today' in data:
+            return {data['today']: set(data.get('today_users', []))}
+        return {}
+
+    @staticmethod
+    def _read(path: str) -> Optional[Dict]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _day_index(self, day: date = None) -> int:
+        return ((day or date.today()) - self.epoch).days
+
+    @staticmethod
+    def _bump(series: array, index: int, value: int = None):
+        if len(series) <= index:
+            series.extend([0] * (index + 1 - len(series)))
+        series[index] = series[index] + 1 if value is None else value
+
+    def record(self, mode: str, user_id: int = None):
+        """Учет одной генерации: O(1), запись на диск не чаще ROLLUP_FLUSH_INTERVAL"""
+        self._ensure_loaded()
+        today = self._day_index()
+        self._bump(self.modes.setdefault(mode, array('I')), today)
+
+        today_users = self.day_users.setdefault(today, set())
+        if user_id is not None and user_id not in today_users:
+            today_users.add(user_id)
+            self._bump(self.users, today, len(today_users))
+
+        self._dirty = True
+        if time.monotonic() - self._last_flush >= ROLLUP_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        if not self._dirty:
+            return
+        oldest = self._day_index() - ROLLUP_USER_DAYS + 1
+        self.day_users = {day: ids for day, ids in self.day_users.items() if day >= oldest}
+        data = {
+            'epoch': self.epoch.isoformat(),
+            'modes': {mode: list(counts) for mode, counts in self.modes.items()},
+            'users': list(self.users),
+            'day_users': {str(day): list(ids) for day, ids in self.day_users.items()}
+        }
+        try:
+            write_json_atomic(self.path, data)
+            self._dirty = False
+            self._last_flush = time.monotonic()
+        except Exception as e:
+            logger.error(f"Ошибка сохранения глобальной статистики: {e}")
+
+    def query(self, days: int = 30) -> Dict:
+        """Ряды за последние days дней по всем процессам: O(файлов × дней), без чтения файлов пользователей
+
+        Пользователи за последние ROLLUP_USER_DAYS дней считаются объединением множеств всех процессов,
+        за более ранние дни — суммой счетчиков процессов (пользователь разных процессов учтен дважды).
+        """
+        self._ensure_loaded()
+        self.flush()
+        today = date.today()
+        modes = {}
+        users = [0] * days
+        user_sets = {}  # позиция дня в окне -> объединение множеств процессов
+        for name in os.listdir(self.storage_dir):
+            if not (name.startswith("rollup_") and name.endswith(".json")):
+                continue
+            data = self._read(os.path.join(self.storage_dir, name))
+            if not data:
+                continue
+            # Индекс сегодняшнего дня в рядах этого файла
+            end = (today - date.fromisoformat(data['epoch'])).days
+            for mode, counts in data['modes'].items():
+                window = modes.setdefault(mode, [0] * days)
+                self._add_window(window, counts, end, days)
+
+            counts = list(data['users'])
+            for day, ids in self._day_sets(data).items():
+                position = days - 1 - (end - day)
+                if 0 <= position < days:
+                    user_sets.setdefault(position, set()).update(ids)
+                    if day < len(counts):
+                        counts[day] = 0  # день учтен множеством
+            self._add_window(users, counts, end, days)
+
+        for position, ids in user_sets.items():
+            users[position] += len(ids)
+
+        total = [sum(values) for values in zip(*modes.values())] if modes else [0] * days
+        return {
+            'days': [(today - timedelta(days=days - 1 - i)).isoformat() for i in range(days)],
+            'modes': modes,
+            'total': total,
+            'users': users
+        }
+
+    @staticmethod
+    def _add_window(window: List[int], counts: List[int], end: int, days: int):
+        for i in range(days):
+            index = end - (days - 1 - i)
+            if 0 <= index < len(counts):
+                window[i] += counts[index]
+
+
+usage_rollup = UsageRollup()
+atexit.register(usage_rollup.flush)
 
 # ==================== КЛАСС ГЕНЕРАТОРА ПАРОЛЕЙ ====================
 
+pronounceable_generator = PronounceableGenerator()  # таблицы переходов строятся один раз на процесс
+
+
 class AdvancedPasswordGenerator:
-    def __init__(self, user_id: int = None):
+    PASSPHRASE_WORDS = ["river", "sun", "mountain", "forest", "wind", "ocean", "star", "moon",
+                        "book", "city", "home", "light", "shadow", "path", "dream", "morning"]
+    PASSPHRASE_SEPARATORS = ["-", "_", ".", ""]
+
+    def __init__(self, user_id: int = None, track_stats: bool = True):
+        self.user_id = user_id
+        self.track_stats = track_stats
         self.lowercase = string.ascii_lowercase
         self.uppercase = string.ascii_uppercase
         self.digits = string.digits
         self.symbols = "!@#$%^&*()_+-=[]{}|;:,.<>?"
-        self.password_manager = PasswordManager(user_id)
+        # Без учета статистики (пул inline-режима) хранилище и файл статистики не читаются
+        self.password_manager = PasswordManager(user_id) if track_stats else None
         
         self.stats_file = f"user_data/stats_{user_id}.json" if user_id else "stats.json"
-        self.stats = self.load_stats()
+        self.stats = self.load_stats() if track_stats else self._get_default_stats()
         
         self.strength_emojis = {
             0: "❌ Очень слабый",
@@ -159,6 +1100,28 @@ class AdvancedPasswordGenerator:
         self._update_stats("advanced")
         return password_str
 
+    def generate_pronounceable_password(self, length: int = 16) -> Tuple[str, float]:
+        """Произносимый пароль по цепи Маркова и его точная энтропия в битах"""
+        password, bits = pronounceable_generator.generate(length)
+        self._update_stats("pronounceable")
+        return password, bits
+
+    def generate_passphrase(self, word_count: int = 4, add_numbers: bool = True, add_caps: bool = True) -> str:
+        """Генерация пасфразы из слов"""
+        words = []
+        for _ in range(word_count):
+            word = random.choice(self.PASSPHRASE_WORDS)
+            if add_caps and random.choice([True, False]):
+                word = word.capitalize()
+            words.append(word)
+        
+        passphrase = random.choice(self.PASSPHRASE_SEPARATORS).join(words)
+        if add_numbers:
+            number = str(random.randint(10, 999))
+            passphrase += random.choice([number, f"-{number}", f"_{number}"])
+        self._update_stats("passphrase")
+        return passphrase
+
     def analyze_password(self, password: str) -> Dict:
         """Анализ сложности пароля"""
         score = 0
@@ -192,7 +1155,7 @@ class AdvancedPasswordGenerator:
         
         return {
             'length': length,
-            'strength': self.strength_emojis.get(score, "❓ Неизвестно"),
+            'strength': self.strength_emojis.get(min(score, 5), "❓ Неизвестно"),
             'score': score,
             'entropy': round(entropy, 2),
             'contains': {
@@ -250,6 +1213,8 @@ class AdvancedPasswordGenerator:
 
     def _update_stats(self, mode: str):
         """Обновление статистики"""
+        if not self.track_stats:
+            return
         if "mode_usage" not in self.stats:
             self.stats["mode_usage"] = {}
         
@@ -257,6 +1222,7 @@ class AdvancedPasswordGenerator:
         self.stats["generated"] = self.stats.get("generated", 0) + 1
         self.stats["generated_today"] = self.stats.get("generated_today", 0) + 1
         self.save_stats()
+        usage_rollup.record(mode, self.user_id)
 
     def load_stats(self) -> Dict:
         """Загрузка статистики"""
@@ -273,8 +1239,7 @@ class AdvancedPasswordGenerator:
     def save_stats(self):
         """Сохранение статистики"""
         try:
-            with open(self.stats_file, 'w', encoding='utf-8') as f:
-                json.dump(self.stats, f, ensure_ascii=False, indent=2)
+            write_json_atomic(self.stats_file, self.stats)
         except Exception as e:
             logger.error(f"Ошибка сохранения статистики: {e}")
 
@@ -295,13 +1260,717 @@ class AdvancedPasswordGenerator:
             stats["generated_today"] = 0
             stats["last_reset"] = today
 
-# ==================== ТЕЛЕГРАМ БОТ ====================
+# ==================== ПУЛ ПАРОЛЕЙ ДЛЯ INLINE-РЕЖИМА ====================
+
+INLINE_POOL_DEPTH = int(os.getenv("INLINE_POOL_DEPTH", "16"))  # паролей в пуле каждой политики и длины
+INLINE_REFILL_INTERVAL = float(os.getenv("INLINE_REFILL_INTERVAL", "1.0"))  # секунд между пополнениями
+INLINE_REFILL_BATCH = int(os.getenv("INLINE_REFILL_BATCH", "256"))  # максимум паролей за одно пополнение
+INLINE_DEFAULT_LENGTH = 16
+INLINE_WARM_LENGTHS = (12, 16, 20)
+
+
+class PasswordPool:
+    """Заранее сгенерированные пароли по политикам; фоновая задача держит пулы заполненными"""
+
+    POLICIES = ('simple', 'strong', 'advanced', 'passphrase')
+
+    def __init__(self, depth: int = INLINE_POOL_DEPTH, refill_batch: int = INLINE_REFILL_BATCH):
+        self.depth = depth
+        self.refill_batch = refill_batch
+        self.generator = AdvancedPasswordGenerator(track_stats=False)
+        self.pools = {}  # (политика, параметр) -> deque[(пароль, сложность)]
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        for length in INLINE_WARM_LENGTHS:
+            self._ensure_pools(length)
+
+    @staticmethod
+    def _pool_key(policy: str, length: int) -> Tuple[str, int]:
+        # Для пасфраз длина переводится в число слов
+        if policy == 'passphrase':
+            return policy, max(3, min(6, round(length / 5)))
+        return policy, length
+
+    def _ensure_pools(self, length: int):
+        for policy in self.POLICIES:
+            self.pools.setdefault(self._pool_key(policy, length), deque())
+
+    def _generate(self, key: Tuple[str, int]) -> Tuple[str, str]:
+        policy, param = key
+        if policy == 'simple':
+            password = self.generator.generate_simple_password(param)
+        elif policy == 'strong':
+            password = self.generator.generate_strong_password(param)
+        elif policy == 'advanced':
+            password = self.generator.generate_advanced_password(param)
+        else:
+            password = self.generator.generate_passphrase(param)
+        self.generated += 1
+        return password, self.generator.analyze_password(password)['strength']
+
+    def take(self, policy: str, length: int) -> Tuple[str, str]:
+        """Пароль и его сложность; при пустом пуле генерируется на месте"""
+        key = self._pool_key(policy, length)
+        pool = self.pools.get(key)
+        if pool:
+            self.hits += 1
+            return pool.popleft()
+        self.misses += 1
+        # Запрошенная длина становится «тёплой» и дальше пополняется фоновой задачей
+        self._ensure_pools(length)
+        return self._generate(key)
+
+    def refill(self) -> int:
+        """Дозаполнение пулов, не более refill_batch паролей за вызов"""
+        budget = self.refill_batch
+        # Вызывается из потока: take() в цикле событий может добавить новые пулы во время обхода
+        for key, pool in list(self.pools.items()):
+            while len(pool) < self.depth and budget > 0:
+                pool.append(self._generate(key))
+                budget -= 1
+            if budget == 0:
+                break
+        return self.refill_batch - budget
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def snapshot(self) -> Dict:
+        return {
+            'pools': len(self.pools),
+            'depth': self.depth,
+            'filled': sum(len(pool) for pool in self.pools.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hit_rate() * 100, 1),
+            'generated': self.generated,
+            'refill_batch': self.refill_batch,
+            'refill_interval': INLINE_REFILL_INTERVAL
+        }
+
+# ==================== ХРАНИЛИЩЕ СГЕНЕРИРОВАННЫХ ПАРОЛЕЙ ====================
+
+GENERATED_TOKEN_TTL = int(os.getenv("GENERATED_TOKEN_TTL", "600"))  # секунд жизни кнопки «Сохранить»
+GENERATED_TOKEN_LIMIT = int(os.getenv("GENERATED_TOKEN_LIMIT", "10000"))  # максимум паролей в памяти
+
+
+class GeneratedPasswordStore:
+    """Короткие токены вместо паролей в callback_data; память ограничена по числу и времени жизни"""
+
+    def __init__(self, ttl: int = GENERATED_TOKEN_TTL, max_size: int = GENERATED_TOKEN_LIMIT):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._items = OrderedDict()  # токен -> (user_id, пароль, момент истечения)
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, user_id: int, password: str) -> str:
+        now = time.monotonic()
+        # TTL одинаковый, поэтому порядок вставки совпадает с порядком истечения
+        while self._items and (len(self._items) >= self.max_size or next(iter(self._items.values()))[2] <= now):
+            self._items.popitem(last=False)
+        token = secrets.token_urlsafe(6)
+        while token in self._items:
+            token = secrets.token_urlsafe(6)
+        self._items[token] = (user_id, password, now + self.ttl)
+        return token
+
+    def pop(self, user_id: int, token: str) -> Optional[str]:
+        """Одноразовое получение пароля; чужие и истекшие токены не раскрываются"""
+        entry = self._items.get(token)
+        if entry is None or entry[0] != user_id:
+            return None
+        del self._items[token]
+        if entry[2] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def peek(self, user_id: int, token: str) -> Optional[str]:
+        """Пароль без погашения токена (для показа QR)"""
+        entry = self._items.get(token)
+        if entry is None or entry[0] != user_id or entry[2] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def take(self, moved) -> Dict[int, List[Tuple[str, str, float]]]:
+        """Забрать живые токены пользователей, для которых moved(user_id) истинно: user_id -> [(токен, пароль, сек. до истечения)]"""
+        now = time.monotonic()
+        taken = {}
+        for token, (user_id, password, expires_at) in list(self._items.items()):
+            if moved(user_id):
+                del self._items[token]
+                if expires_at > now:
+                    taken.setdefault(user_id, []).append((token, password, expires_at - now))
+        return taken
+
+    def adopt(self, user_id: int, items: List[Tuple[str, str, float]]):
+        """Принять токены от другого воркера; они истекают раньше новых, но pop и peek проверяют срок сами"""
+        now = time.monotonic()
+        for token, password, ttl_left in items:
+            if len(self._items) >= self.max_size:
+                self._items.popitem(last=False)
+            self._items[token] = (user_id, password, now + ttl_left)
+
+# ==================== ВЫПУСК УНИКАЛЬНЫХ КОДОВ ====================
+
+CODE_ALPHABET = "23456789ABCDEFGHJKLMNPQRSTUVWXYZ"  # без 0/O и 1/I, которые легко перепутать
+CODE_LENGTH = 12
+CODE_FEISTEL_ROUNDS = 10
+CODE_ISSUE_CHUNK = 65536  # кодов за одну запись курсора при крупном выпуске из CLI
+CODE_ISSUE_LIMIT = 100000  # кодов за одну команду
+CODE_SERIES_FORMAT = "unlockcode-codes/1"
+
+
+class FeistelPermutation:
+    """Ключевая перестановка чисел [0, n): сеть Фейстеля по модулю half (half² ≥ n) с cycle-walking.
+
+    Раунд: (L, R) -> (R, (L + F(R)) mod half), где F — BLAKE2b с ключом. Значения вне [0, n)
+    снова прогоняются через сеть, пока не попадут в диапазон, поэтому это биекция на [0, n).
+    """
+
+    def __init__(self, n: int, key: bytes, rounds: int = CODE_FEISTEL_ROUNDS):
+        if n < 2:
+            raise ValueError("В пространстве кодов должно быть хотя бы 2 значения")
+        self.n = n
+        self.half = math.isqrt(n - 1) + 1
+        self.rounds = rounds
+        self._width = (self.half.bit_length() + 7) // 8
+        # 8 лишних байт выхода делают смещение F по модулю half пренебрежимым
+        prf = hashlib.blake2b(key=key, digest_size=min(64, max(16, self._width + 8)))
+        # Состояние хеша с ключом и номером раунда готовится один раз, на каждый вызов — только copy()
+        self._round_prfs = []
+        for index in range(rounds):
+            h = prf.copy()
+            h.update(bytes((index,)))
+            self._round_prfs.append(h)
+
+    def _round(self, index: int, value: int) -> int:
+        h = self._round_prfs[index].copy()
+        h.update(value.to_bytes(self._width, 'big'))
+        return int.from_bytes(h.digest(), 'big') % self.half
+
+    def encrypt(self, x: int) -> int:
+        half, f = self.half, self._round
+        while True:
+            left, right = divmod(x, half)
+            for i in range(self.rounds):
+                left, right = right, (left + f(i, right)) % half
+            x = left * half + right
+            if x < self.n:
+                return x
+
+    def decrypt(self, y: int) -> int:
+        half, f = self.half, self._round
+        while True:
+            left, right = divmod(y, half)
+            for i in reversed(range(self.rounds)):
+                left, right = (right - f(i, left)) % half, left
+            y = left * half + right
+            if y < self.n:
+                return y
+
+
+class CodeSeries:
+    """Серия одноразовых кодов: номер -> перестановка -> строка фиксированной длины в алфавите.
+
+    Повторов нет по построению, состояние серии — один счетчик. Процессы забирают
+    непересекающиеся диапазоны под файловой блокировкой; курсор пишется до выдачи кодов,
+    поэтому код, выпуск которого прервал сбой, считается выданным, но повторов нет.
+    """
+
+    NAME_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+    def __init__(self, name: str, alphabet: str = None, length: int = None, storage_dir: str = "user_data",
+                 create: bool = True):
+        if not self.NAME_PATTERN.fullmatch(name):
+            raise ValueError("Имя серии: латиница, цифры, _ и -, до 64 символов")
+        self.name = name
+        self.storage_dir = os.path.join(storage_dir, "codes")
+        self.config_path = os.path.join(self.storage_dir, f"{name}.json")
+        self.cursor_path = os.path.join(self.storage_dir, f"{name}.cursor")
+
+        config = self._read(self.config_path)
+        if config is None:
+            if not create:  # проверка кода не должна заводить серию с новым ключом из-за опечатки
+                raise ValueError(f"Серия {name} не найдена")
+            config = self._create(alphabet or CODE_ALPHABET, length or CODE_LENGTH)
+        elif (alphabet and alphabet != config['alphabet']) or (length and length != config['length']):
+            raise ValueError(f"Серия {name} уже создана с другим алфавитом или длиной")
+        self.alphabet = config['alphabet']
+        self.length = config['length']
+        self.created = config['created']
+        self.capacity = len(self.alphabet) ** self.length
+        self._digits = {ch: i for i, ch in enumerate(self.alphabet)}
+        self._permutation = FeistelPermutation(self.capacity, bytes.fromhex(config['key']))
+        self._lock = UserFileLock(f"codes_{name}", self.storage_dir)
+
+    @staticmethod
+    def _read(path: str) -> Optional[Dict]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _create(self, alphabet: str, length: int) -> Dict:
+        alphabet = ''.join(dict.fromkeys(alphabet))
+        if len(alphabet) < 2 or length < 1 or len(alphabet) ** length < 2:
+            raise ValueError("Нужно минимум 2 символа алфавита и длина от 1")
+        if len(alphabet) ** length >= 1 << 256:
+            raise ValueError("Пространство кодов больше 2^256 — уменьшите длину")
+        config = {
+            'format': CODE_SERIES_FORMAT,
+            'alphabet': alphabet,
+            'length': length,
+            'key': secrets.token_hex(32),
+            'created': datetime.now().isoformat()
+        }
+        os.makedirs(self.storage_dir, exist_ok=True)
+        # O_EXCL: если серию одновременно создал другой процесс, берем его ключ
+        try:
+            fd = os.open(self.config_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            return self._read(self.config_path)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+        return config
+
+    def issued(self) -> int:
+        """Сколько номеров уже выдано всеми процессами"""
+        cursor = self._read(self.cursor_path)
+        return cursor['issued'] if cursor else 0
+
+    def lease(self, size: int) -> range:
+        """Забрать следующие size номеров целиком; если столько не осталось — ValueError, ничего не забирая"""
+        with self._lock:
+            start = self.issued()
+            if start + size > self.capacity:
+                raise ValueError(f"В серии {self.name} осталось {self.capacity - start} кодов, запрошено {size}")
+            write_json_atomic(self.cursor_path, {'issued': start + size})
+        return range(start, start + size)
+
+    def code_at(self, index: int) -> str:
+        value = self._permutation.encrypt(index)
+        chars = [''] * self.length
+        base = len(self.alphabet)
+        for i in range(self.length - 1, -1, -1):
+            value, digit = divmod(value, base)
+            chars[i] = self.alphabet[digit]
+        return ''.join(chars)
+
+    def index_of(self, code: str) -> Optional[int]:
+        """Номер, из которого получен код; None если строка не из этой серии"""
+        if self.alphabet == self.alphabet.upper():
+            code = code.upper()  # в алфавите нет строчных — регистр при вводе не важен
+        code = ''.join(ch for ch in code.strip() if ch not in "- " or ch in self._digits)
+        if len(code) != self.length:
+            return None
+        value = 0
+        base = len(self.alphabet)
+        for ch in code:
+            digit = self._digits.get(ch)
+            if digit is None:
+                return None
+            value = value * base + digit
+        return self._permutation.decrypt(value)
+
+    def verify(self, code: str) -> Optional[int]:
+        """Номер кода, если он действительно был выдан"""
+        index = self.index_of(code)
+        return index if index is not None and index < self.issued() else None
+
+    def issue(self, count: int) -> Iterator[str]:
+        """Ровно count новых кодов; номера резервируются одной записью на диск"""
+        if count < 1:
+            return iter(())
+        return map(self.code_at, self.lease(count))
+
+    @staticmethod
+    def format_code(code: str, group: int = 0) -> str:
+        if group <= 0:
+            return code
+        return '-'.join(code[i:i + group] for i in range(0, len(code), group))
+
+# ==================== СНИМКИ ДАННЫХ ====================
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "0"))  # секунд между автоснимками, 0 — выключено
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "0"))  # сколько последних снимков хранить, 0 — все
+SNAPSHOT_BUCKETS = 4096  # корзин в снимке; неизменная корзина не занимает места
+SNAPSHOT_CHUNK_SIZE = 1024 * 1024  # большие файлы хранятся кусками
+SNAPSHOT_RACY_WINDOW = 2.0  # секунд: у свежих файлов mtime не запоминается, в следующий раз они перечитываются
+SNAPSHOT_FORMAT = "unlockcode-snapshot/1"
+USER_FILE_PATTERN = re.compile(r'(?:passwords|stats)_(\d+)\.json')
+BOT_LOCK_NAME = "bot"  # user_data/.lock_bot держит запущенный бот; восстановление без него не идет
+
+
+class SnapshotStore:
+    """Инкрементальные снимки user_data в хранилище сжатых объектов, адресуемых по sha256.
+
+    Файл перечитывается, только если изменились его mtime или размер; одинаковое содержимое
+    хранится один раз. Список файлов разбит на корзины по пользователю: корзина без изменений
+    дает тот же объект, поэтому снимок занимает место пропорционально изменениям,
+    а восстановление одного пользователя читает одну корзину.
+    """
+
+    def __init__(self, data_dir: str = "user_data", store_dir: str = SNAPSHOT_DIR):
+        self.data_dir = data_dir
+        self.store_dir = store_dir
+        self.objects_dir = os.path.join(store_dir, "objects")
+        self.manifests_dir = os.path.join(store_dir, "manifests")
+        self.latest_path = os.path.join(store_dir, "latest.json")  # ID и время последнего снимка
+
+    # ---------- объекты ----------
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def _put_object(self, data: bytes) -> Tuple[str, int]:
+        """Хеш содержимого и число записанных байт (0, если такой объект уже есть)"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            return digest, 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        packed = zlib.compress(data, 6)
+        self._write_atomic(path, packed)
+        return digest, len(packed)
+
+    def _get_object(self, digest: str) -> bytes:
+        with open(self._object_path(digest), 'rb') as f:
+            data = zlib.decompress(f.read())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Объект {digest} поврежден")
+        return data
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes, mtime_ns: int = None):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        if mtime_ns:
+            os.utime(tmp_path, ns=(mtime_ns, mtime_ns))
+        os.replace(tmp_path, path)
+
+    # ---------- корзины ----------
+
+    @staticmethod
+    def _owner(rel_path: str) -> str:
+        """ID пользователя для его файлов, для остальных — сам путь"""
+        match = USER_FILE_PATTERN.fullmatch(rel_path)
+        return match.group(1) if match else rel_path
+
+    @staticmethod
+    def _bucket(owner: str) -> str:
+        return str(zlib.crc32(owner.encode('utf-8')) % SNAPSHOT_BUCKETS)
+
+    def _scan(self) -> Dict[str, List[Tuple[str, str]]]:
+        """Корзина -> [(путь в снимке, путь на диске)]; блокировки и временные файлы пропускаются"""
+        buckets = {}
+        store = os.path.realpath(self.store_dir)
+        stack = [(self.data_dir, "")]
+        while stack:
+            directory, prefix = stack.pop()
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith(".lock_") or entry.name.endswith(".tmp"):
+                        continue
+                    rel_path = prefix + entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        if os.path.realpath(entry.path) != store:
+                            stack.append((entry.path, rel_path + "/"))
+                    elif entry.is_file(follow_symlinks=False):
+                        buckets.setdefault(self._bucket(self._owner(rel_path)), []).append((rel_path, entry.path))
+        return buckets
+
+    # ---------- снимки ----------
+
+    def create_if_stale(self, max_age: float) -> Optional[Dict]:
+        """Снимок, только если последний старше max_age секунд; читается один маленький файл"""
+        pointer = self._latest_pointer()
+        if pointer and (datetime.now() - datetime.fromisoformat(pointer['created'])).total_seconds() < max_age:
+            return None
+        return self.create()
+
+    def create(self) -> Optional[Dict]:
+        """Новый снимок; без изменений — последний с unchanged=True; None, если снимает другой процесс"""
+        lock = UserFileLock("snapshot", self.store_dir)
+        if not lock.try_acquire():
+            return None
+        try:
+            return self._create()
+        finally:
+            lock.release()
+
+    def _create(self) -> Dict:
+        started = time.time()
+        parent = self.latest()
+        previous_buckets = parent['buckets'] if parent else {}
+        racy_ns = int((started - SNAPSHOT_RACY_WINDOW) * 1e9)
+        totals = Counter()
+        buckets = {}
+        for bucket, files in self._scan().items():
+            digest = previous_buckets.get(bucket)
+            previous = json.loads(self._get_object(digest)) if digest else {}
+            entries = {}
+            for rel_path, path in sorted(files):
+                entry = self._snapshot_file(path, previous.get(rel_path), racy_ns, totals)
+                if entry is not None:
+                    entries[rel_path] = entry
+            if entries:
+                data = json.dumps(entries, sort_keys=True, separators=(',', ':')).encode('utf-8')
+                buckets[bucket], stored = self._put_object(data)
+                totals['stored_bytes'] += stored
+        if parent and buckets == parent['buckets']:
+            # Ничего не изменилось: последний снимок и так описывает текущее состояние
+            return {**parent, 'unchanged': True}
+
+        now = datetime.now()
+        snapshot_id = now.strftime("%Y%m%d-%H%M%S-%f")
+        manifest = {
+            'format': SNAPSHOT_FORMAT,
+            'id': snapshot_id,
+            'created': now.isoformat(),
+            'parent': parent['id'] if parent else None,
+            'buckets': buckets,
+            'files': totals['files'],
+            'bytes': totals['bytes'],
+            'read': totals['read'],
+            'new_objects': totals['new_objects'],
+            'stored_bytes': totals['stored_bytes'],
+            'seconds': round(time.time() - started, 3)
+        }
+        os.makedirs(self.manifests_dir, exist_ok=True)
+        write_json_atomic(os.path.join(self.manifests_dir, f"{snapshot_id}.json"), manifest)
+        write_json_atomic(self.latest_path, {'id': snapshot_id, 'created': manifest['created']})
+        if SNAPSHOT_KEEP > 0:
+            self._prune(SNAPSHOT_KEEP)
+        return manifest
+
+    def _snapshot_file(self, path: str, previous: Optional[list], racy_ns: int, totals: Counter) -> Optional[list]:
+        """[mtime_ns, размер, [хеши кусков]]; без изменений mtime и размера файл не читается"""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:  # удален во время снимка
+            return None
+        if previous and previous[0] and previous[0] == st.st_mtime_ns and previous[1] == st.st_size:
+            totals['files'] += 1
+            totals['bytes'] += st.st_size
+            return previous
+
+        chunks, size = [], 0
+        try:
+            with open(path, 'rb') as f:
+                # Бот пишет файлы через os.replace: открытый файл уже не изменится, его mtime — из fstat
+                st = os.fstat(f.fileno())
+                for block in iter(lambda: f.read(SNAPSHOT_CHUNK_SIZE), b''):
+                    digest, stored = self._put_object(block)
+                    chunks.append(digest)
+                    size += len(block)
+                    totals['new_objects'] += stored > 0
+                    totals['stored_bytes'] += stored
+        except FileNotFoundError:
+            return None
+        totals['files'] += 1
+        totals['bytes'] += size
+        totals['read'] += 1
+        # mtime с грубой точностью мог не измениться при записи сразу после чтения — такой не запоминаем
+        return [st.st_mtime_ns if st.st_mtime_ns < racy_ns else 0, size, chunks]
+
+    def manifests(self) -> List[Dict]:
+        """Снимки от старых к новым"""
+        try:
+            names = sorted(name for name in os.listdir(self.manifests_dir) if name.endswith(".json"))
+        except FileNotFoundError:
+            return []
+        manifests = []
+        for name in names:
+            with open(os.path.join(self.manifests_dir, name), 'r', encoding='utf-8') as f:
+                manifests.append(json.load(f))
+        return manifests
+
+    def _latest_pointer(self) -> Optional[Dict]:
+        try:
+            with open(self.latest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _manifest(self, snapshot_id: str) -> Optional[Dict]:
+        try:
+            with open(os.path.join(self.manifests_dir, f"{snapshot_id}.json"), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def latest(self) -> Optional[Dict]:
+        pointer = self._latest_pointer()
+        if pointer:
+            manifest = self._manifest(pointer['id'])
+            if manifest:
+                return manifest
+        # Хранилище без указателя (создано до него): последний по имени
+        manifests = self.manifests()
+        return manifests[-1] if manifests else None
+
+    def find(self, snapshot_id: str = None, at: datetime = None) -> Dict:
+        """Снимок по ID, последний на момент at или просто последний"""
+        if snapshot_id:
+            manifest = self._manifest(snapshot_id) if os.path.basename(snapshot_id) == snapshot_id else None
+        elif at:
+            manifests = [m for m in self.manifests() if datetime.fromisoformat(m['created']) <= at]
+            manifest = manifests[-1] if manifests else None
+        else:
+            manifest = self.latest()
+        if not manifest:
+            raise ValueError("Подходящий снимок не найден")
+        return manifest
+
+    def restore(self, manifest: Dict, user_id: int = None, target_dir: str = None,
+                allow_empty: bool = False) -> Tuple[int, int]:
+        """Вернуть файлы пользователей (всех или одного) к состоянию снимка: (восстановлено, удалено).
+
+        Восстанавливаются только passwords_<id>.json и stats_<id>.json; коды серий и глобальная
+        статистика не трогаются, иначе курсоры серий откатились бы и коды выдались повторно.
+        Файлы пользователей, которых в снимке не было, удаляются. Если в снимке нет файлов
+        выбранного пользователя, восстановление отказывается стирать его хранилище без allow_empty.
+        В живой user_data — только при остановленном боте: его кэши в памяти не узнали бы о подмене файлов.
+        """
+        target_dir = target_dir or self.data_dir
+        lock = None
+        if os.path.realpath(target_dir) == os.path.realpath(self.data_dir):
+            lock = UserFileLock(BOT_LOCK_NAME, target_dir)
+            if not lock.try_acquire():
+                raise RuntimeError("Бот запущен: остановите его перед восстановлением или укажите --target")
+        try:
+            return self._restore(manifest, user_id, target_dir, allow_empty)
+        finally:
+            if lock:
+                lock.release()
+
+    def _restore(self, manifest: Dict, user_id: Optional[int], target_dir: str,
+                 allow_empty: bool) -> Tuple[int, int]:
+        owner = str(user_id) if user_id is not None else None
+        buckets = [self._bucket(owner)] if owner else list(manifest['buckets'])
+        os.makedirs(target_dir, exist_ok=True)
+        kept = set()
+        for bucket in buckets:
+            digest = manifest['buckets'].get(bucket)
+            if not digest:
+                continue
+            for rel_path, (mtime_ns, _, chunks) in json.loads(self._get_object(digest)).items():
+                match = USER_FILE_PATTERN.fullmatch(rel_path)
+                if not match or (owner and match.group(1) != owner):
+                    continue
+                data = b''.join(self._get_object(chunk) for chunk in chunks)
+                self._write_atomic(os.path.join(target_dir, rel_path), data, mtime_ns)
+                kept.add(rel_path)
+        if owner and not kept and not allow_empty:
+            # Опечатка в --user или снимок старше пользователя: без явного флага хранилище не стираем
+            raise ValueError(f"В снимке {manifest['id']} нет файлов пользователя {owner}; "
+                             f"чтобы удалить его текущие файлы, добавьте --allow-empty")
+
+        removed = 0
+        for name in os.listdir(target_dir):
+            match = USER_FILE_PATTERN.fullmatch(name)
+            if match and name not in kept and (not owner or match.group(1) == owner):
+                os.remove(os.path.join(target_dir, name))
+                removed += 1
+        return len(kept), removed
+
+    def prune(self, keep: int) -> int:
+        """Оставить keep последних снимков и удалить объекты, на которые они не ссылаются"""
+        with UserFileLock("snapshot", self.store_dir):
+            return self._prune(keep)
+
+    def _prune(self, keep: int) -> int:
+        manifests = self.manifests()
+        for manifest in manifests[:-keep]:
+            os.remove(os.path.join(self.manifests_dir, f"{manifest['id']}.json"))
+        live = set()
+        for manifest in manifests[-keep:]:
+            for digest in manifest['buckets'].values():
+                if digest in live:
+                    continue
+                live.add(digest)
+                for _, _, chunks in json.loads(self._get_object(digest)).values():
+                    live.update(chunks)
+        removed = 0
+        for prefix in os.listdir(self.objects_dir) if os.path.isdir(self.objects_dir) else []:
+            for name in os.listdir(os.path.join(self.objects_dir, prefix)):
+                if prefix + name not in live:
+                    os.remove(os.path.join(self.objects_dir, prefix, name))
+                    removed += 1
+        return removed
+
+
+snapshot_store = SnapshotStore()
+
+# ==================== ТЕЛЕГРАМ БОТ ====================
+
+LIST_PAGE_SIZE = 30
+SEARCH_RESULTS_LIMIT = 8
+CONCURRENT_UPDATES = int(os.getenv("BOT_CONCURRENT_UPDATES", "16"))  # обновлений в обработке одновременно
+
+
+class UserLockUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка обновлений разных пользователей, последовательная — одного.
+
+    Внутри процесса порядок держит asyncio.Lock пользователя. В режиме воркеров (file_locks=True)
+    дополнительно берется UserFileLock: пользователь на время перебалансировки может оказаться
+    у двух процессов. Занятая блокировка не отбрасывает обновление: ожидание продолжается.
+    """
+
+    def __init__(self, max_concurrent_updates: int = CONCURRENT_UPDATES, file_locks: bool = False):
+        super().__init__(max_concurrent_updates)
+        self.file_locks = file_locks
+        self._user_locks = {}  # user_id -> [asyncio.Lock, число ожидающих и работающих]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_process_update(self, update: object, coroutine):
+        user = update.effective_user if isinstance(update, Update) else None
+        if user is None:
+            await coroutine
+            return
+        entry = self._user_locks.setdefault(user.id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                if not self.file_locks:
+                    await coroutine
+                    return
+                file_lock = UserFileLock(user.id)
+                while not await file_lock.acquire_async():
+                    logger.warning(f"Блокировка пользователя {user.id} занята другим процессом, ожидание продолжается")
+                try:
+                    await coroutine
+                finally:
+                    file_lock.release()
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._user_locks[user.id]
+
 
 class PasswordGeneratorBot:
-    def __init__(self, token: str):
+    def __init__(self, token: str, api_url: Optional[str] = None, file_locks: bool = False):
         self.token = token
         self.user_sessions = {}  # Хранение состояний пользователей
-        self.application = Application.builder().token(token).build()
+        self.password_pool = PasswordPool()
+        self.generated_passwords = GeneratedPasswordStore()
+        builder = (Application.builder().token(token).post_init(self._post_init)
+                   .concurrent_updates(UserLockUpdateProcessor(file_locks=file_locks)))
+        if api_url:  # локальный Bot API сервер (например, нагрузочный стенд loadtest.py)
+            builder = builder.base_url(api_url)
+        self.application = builder.build()
         
         # Регистрация обработчиков
         self.setup_handlers()
@@ -320,13 +1989,59 @@ class PasswordGeneratorBot:
         self.application.add_handler(CommandHandler("stats", self.stats_command))
         self.application.add_handler(CommandHandler("check", self.check_expiry_command))
         self.application.add_handler(CommandHandler("delete", self.delete_password_command))
+        self.application.add_handler(CommandHandler("unlock", self.unlock_command))
+        self.application.add_handler(CommandHandler("lock", self.lock_command))
+        self.application.add_handler(CommandHandler("encrypt", self.encrypt_command))
+        self.application.add_handler(CommandHandler("import", self.import_command))
+        self.application.add_handler(CommandHandler("totp", self.totp_command))
+        self.application.add_handler(CommandHandler("codes", self.codes_command))
+        self.application.add_handler(CommandHandler("qr", self.qr_command))
+        
+        self.application.add_handler(CommandHandler("poolstats", self.pool_stats_command))
+        self.application.add_handler(CommandHandler("globalstats", self.global_stats_command))
+        self.application.add_handler(CommandHandler("issue", self.issue_command))
+        self.application.add_handler(CommandHandler("snapshot", self.snapshot_command))
         
         # Обработчики кнопок
         self.application.add_handler(CallbackQueryHandler(self.button_handler))
         
+        # Inline-режим: @bot <длина> в любом чате
+        self.application.add_handler(InlineQueryHandler(self.inline_query_handler))
+        
         # Обработчики сообщений
+        self.application.add_handler(MessageHandler(filters.Document.ALL, self.import_document))
         self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
     
+    async def _post_init(self, application: Application):
+        """Запуск фоновых задач после инициализации приложения"""
+        await asyncio.to_thread(self.password_pool.refill)
+        application.create_task(self._refill_pool_loop())
+        if SNAPSHOT_INTERVAL > 0:
+            application.create_task(self._snapshot_loop())
+    
+    async def _refill_pool_loop(self):
+        """Фоновое пополнение пула паролей для inline-режима"""
+        while True:
+            await asyncio.sleep(INLINE_REFILL_INTERVAL)
+            try:
+                # Генерация и анализ пачки паролей — в потоке, чтобы не задерживать обработку обновлений
+                await asyncio.to_thread(self.password_pool.refill)
+            except Exception as e:
+                logger.error(f"Ошибка пополнения пула паролей: {e}")
+    
+    async def _snapshot_loop(self):
+        """Периодические снимки user_data в отдельном потоке: обработка обновлений не останавливается"""
+        while True:
+            await asyncio.sleep(SNAPSHOT_INTERVAL)
+            try:
+                # При нескольких воркерах снимок делает тот, кто успел первым
+                manifest = await asyncio.to_thread(snapshot_store.create_if_stale, SNAPSHOT_INTERVAL / 2)
+                if manifest and not manifest.get('unchanged'):
+                    logger.info(f"Снимок {manifest['id']}: файлов {manifest['files']}, перечитано {manifest['read']}, "
+                                f"записано {manifest['stored_bytes']} байт за {manifest['seconds']} с")
+            except Exception as e:
+                logger.error(f"Ошибка снимка данных: {e}")
+    
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка команды /start"""
         user = update.effective_user
@@ -345,6 +2060,10 @@ class PasswordGeneratorBot:
 /stats - Статистика использования
 /check - Проверить устаревшие пароли
 /delete - Удалить пароль
+/unlock - Разблокировать зашифрованное хранилище
+/import - Импорт паролей из браузера или Bitwarden
+/codes - Коды двухфакторной аутентификации
+/qr - QR-код пароля, TOTP или Wi-Fi
 /help - Помощь
 
 ⚡ Для быстрой генерации пароля используйте кнопки ниже!
@@ -377,6 +2096,7 @@ class PasswordGeneratorBot:
   Простой: 10 символов, буквы
   Сложный: 16 символов, буквы+цифры+символы
   Пользовательский: задать свои символы
+  Произносимый: 16 символов из слогов, легко запомнить; показывает точную энтропию
 
 🔍 Анализ паролей:
   /analyze <пароль> - Анализ сложности
@@ -384,20 +2104,42 @@ class PasswordGeneratorBot:
 
 💾 Менеджер паролей:
   /save - Сохранить пароль (запросит сервис, логин, пароль)
-  /list - Список всех сохраненных сервисов
-  /get <сервис> - Получить пароль по сервису
-  /delete <сервис> - Удалить пароль
+  /list [страница] - Список сохраненных сервисов по страницам
+  /get <сервис> - Получить пароль (можно часть имени или с опечаткой)
+  /delete <сервис> - Удалить пароль (с выбором из похожих)
+  /import - Импорт экспорта Chrome/Firefox/Bitwarden (CSV или JSON)
+
+🔢 Двухфакторная аутентификация:
+  /totp <сервис> <секрет или otpauth://...> - Привязать TOTP к сервису
+  /codes - Текущие коды для всех сервисов
+
+📷 QR-коды:
+  /qr <сервис> - QR-код сохраненного пароля
+  /qr totp <сервис> - QR для переноса TOTP в приложение-аутентификатор
+  /qr wifi <сеть> [пароль] - QR для подключения к Wi-Fi;
+    сеть с пробелами — в кавычках или все слова перед паролем
 
 🔄 Преобразование:
   /transform <пароль> - Выбрать тип преобразования
   Доступно: Leet speak, чередование регистра, реверс и др.
 
+⚡ Inline-режим:
+  Наберите @имя_бота 20 в любом чате — готовые пароли длиной 20
+  /poolstats - Состояние пула заранее сгенерированных паролей
+
 📈 Статистика:
   /stats - Показать статистику использования
   /check - Проверить устаревшие пароли (старше 90 дней)
+  /globalstats [дни] [режим] - Статистика всего бота (для администраторов)
+  /issue <серия> [кол-во] - Уникальные одноразовые коды (для администраторов)
+  /issue check <серия> <код> - Проверить, выдавался ли код
+  /snapshot [list] - Снимок данных всех пользователей или список снимков (для администраторов)
 
 🔒 Безопасность:
-  • Все пароли хранятся локально в зашифрованном виде
+  /encrypt <мастер-пароль> - Зашифровать хранилище (или сменить мастер-пароль)
+  /unlock <мастер-пароль> - Разблокировать хранилище на сессию
+  /lock - Заблокировать хранилище
+  • Каждая запись шифруется отдельно, ключ выводится из мастер-пароля
   • Каждый пользователь имеет отдельное хранилище
   • Рекомендуется регулярно менять важные пароли
         """
@@ -415,6 +2157,7 @@ class PasswordGeneratorBot:
                 InlineKeyboardButton("⚙️ Пользовательский", callback_data="gen_custom")
             ],
             [
+                InlineKeyboardButton("🗣️ Произносимый (16 символов)", callback_data="gen_pronounceable"),
                 InlineKeyboardButton("📏 Задать длину", callback_data="gen_length")
             ]
         ]
@@ -445,19 +2188,9 @@ class PasswordGeneratorBot:
     
     async def list_passwords_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка команды /list"""
-        user_id = update.effective_user.id
-        generator = AdvancedPasswordGenerator(user_id)
-        services = generator.password_manager.list_services()
-        
-        if not services:
-            await update.message.reply_text("📭 Нет сохраненных паролей.")
-            return
-        
-        services_text = "💼 Сохраненные сервисы:\n\n"
-        for i, service in enumerate(services, 1):
-            services_text += f"{i}. {service}\n"
-        
-        await update.message.reply_text(services_text)
+        page = int(context.args[0]) - 1 if context.args and context.args[0].isdigit() else 0
+        services_text, reply_markup = self._render_service_page(update.effective_user.id, page)
+        await update.message.reply_text(services_text, reply_markup=reply_markup)
     
     async def get_password_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка команды /get"""
@@ -494,7 +2227,9 @@ class PasswordGeneratorBot:
                 'simple': 'Простой',
                 'strong': 'Сложный',
                 'custom': 'Пользовательский',
-                'advanced': 'Случайный'
+                'advanced': 'Случайный',
+                'passphrase': 'Пасфраза',
+                'pronounceable': 'Произносимый'
             }
             
             for mode, count in sorted(stats['mode_usage'].items(), key=lambda x: x[1], reverse=True):
@@ -503,6 +2238,116 @@ class PasswordGeneratorBot:
         
         await update.message.reply_text(stats_text)
     
+    async def global_stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработка команды /globalstats (только для администраторов)"""
+        if update.effective_user.id not in ADMIN_IDS:
+            await update.message.reply_text("⛔ Команда доступна только администраторам.")
+            return
+        
+        days = int(context.args[0]) if context.args and context.args[0].isdigit() else 30
+        days = max(1, min(days, 365))
+        mode = context.args[1] if context.args and len(context.args) > 1 else None
+        rollup = usage_rollup.query(days)
+        series = rollup['modes'].get(mode, [0] * days) if mode else rollup['total']
+        
+        stats_text = f"🌍 Глобальная статистика за {days} дн."
+        stats_text += f" (режим: {mode})\n\n" if mode else ":\n\n"
+        stats_text += f"🔐 Сгенерировано: {sum(series)}\n"
+        stats_text += f"👥 Активных пользователей сегодня: {rollup['users'][-1]}\n"
+        stats_text += f"📈 Пик за день: {max(series)}\n"
+        
+        if not mode and rollup['modes']:
+            stats_text += "\n🎯 По режимам:\n"
+            for name, counts in sorted(rollup['modes'].items(), key=lambda x: sum(x[1]), reverse=True):
+                stats_text += f"  {name}: {sum(counts)}\n"
+        
+        stats_text += "\n📅 По дням (последние 7):\n"
+        for day, count, users in list(zip(rollup['days'], series, rollup['users']))[-7:]:
+            stats_text += f"  {day}: {count} (👥 {users})\n"
+        
+        await update.message.reply_text(stats_text)
+    
+    async def issue_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработка команды /issue (только для администраторов)"""
+        if update.effective_user.id not in ADMIN_IDS:
+            await update.message.reply_text("⛔ Команда доступна только администраторам.")
+            return
+        
+        args = context.args or []
+        if not args or (args[0] == "check" and len(args) < 3):
+            await update.message.reply_text(
+                "❌ Использование:\n"
+                "/issue <серия> [количество] - выпустить коды\n"
+                "/issue check <серия> <код> - проверить код"
+            )
+            return
+        
+        try:
+            if args[0] == "check":
+                series = CodeSeries(args[1], create=False)
+                index = series.verify(' '.join(args[2:]))
+                if index is None:
+                    await update.message.reply_text("❌ Код не выдавался в этой серии.")
+                else:
+                    await update.message.reply_text(f"✅ Код выдан, номер {index} в серии {series.name}.")
+                return
+            
+            count = int(args[1]) if len(args) > 1 and args[1].isdigit() else 1
+            count = max(1, min(count, CODE_ISSUE_LIMIT))
+            series = CodeSeries(args[0])
+            # Шифрование номеров — чистый CPU, крупные выпуски уходят в поток
+            codes = await asyncio.to_thread(
+                lambda: [CodeSeries.format_code(code, 4) for code in series.issue(count)])
+        except (OSError, ValueError) as e:
+            await update.message.reply_text(f"❌ {e}")
+            return
+        
+        header = f"🎟️ Серия {series.name}: {len(codes)} новых кодов (выдано всего {series.issued()} из {series.capacity})"
+        if len(codes) <= 20:
+            await update.message.reply_text(header + ":\n\n" + '\n'.join(codes))
+        else:
+            document = io.BytesIO(('\n'.join(codes) + '\n').encode('utf-8'))
+            await update.message.reply_document(document, filename=f"{series.name}_{len(codes)}.txt", caption=header)
+    
+    async def snapshot_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработка команды /snapshot (только для администраторов)"""
+        if update.effective_user.id not in ADMIN_IDS:
+            await update.message.reply_text("⛔ Команда доступна только администраторам.")
+            return
+        
+        if context.args and context.args[0] == "list":
+            manifests = await asyncio.to_thread(snapshot_store.manifests)
+            if not manifests:
+                await update.message.reply_text("📭 Снимков пока нет.")
+                return
+            snapshot_text = f"🗂️ Снимков: {len(manifests)}. Последние:\n\n"
+            for manifest in manifests[-10:]:
+                snapshot_text += (f"  {manifest['id']}: файлов {manifest['files']}, "
+                                  f"новых данных {manifest['stored_bytes'] // 1024} КБ\n")
+            await update.message.reply_text(snapshot_text)
+            return
+        
+        try:
+            manifest = await asyncio.to_thread(snapshot_store.create)
+        except (OSError, ValueError, TimeoutError) as e:
+            logger.error(f"Ошибка снимка: {e}")
+            await update.message.reply_text(f"❌ Не удалось сделать снимок: {e}")
+            return
+        if manifest is None:
+            await update.message.reply_text("⏳ Снимок уже делается другим процессом, попробуйте позже.")
+            return
+        if manifest.get('unchanged'):
+            await update.message.reply_text(f"✅ Изменений нет, актуален снимок {manifest['id']} от {manifest['created']}.")
+            return
+        await update.message.reply_text(
+            f"🗂️ Снимок {manifest['id']} готов:\n\n"
+            f"📄 Файлов: {manifest['files']} ({manifest['bytes'] // 1024} КБ)\n"
+            f"🔄 Перечитано изменившихся: {manifest['read']}\n"
+            f"💾 Записано новых данных: {manifest['stored_bytes'] // 1024} КБ\n"
+            f"⏱️ За {manifest['seconds']} с\n\n"
+            f"Восстановление: python bestpswrgen.py restore --id {manifest['id']} [--user ID]"
+        )
+    
     async def check_expiry_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка команды /check"""
         user_id = update.effective_user.id
@@ -530,18 +2375,242 @@ class PasswordGeneratorBot:
     async def delete_password_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка команды /delete"""
         if context.args:
-            service = ' '.join(context.args)
-            user_id = update.effective_user.id
-            generator = AdvancedPasswordGenerator(user_id)
-            
-            if generator.password_manager.delete_password(service):
-                await update.message.reply_text(f"✅ Пароль для '{service}' удален.")
-            else:
-                await update.message.reply_text(f"❌ Пароль для '{service}' не найден.")
+            await self._delete_password(update, ' '.join(context.args))
         else:
             self.user_sessions[update.effective_user.id] = {'action': 'delete_password'}
             await update.message.reply_text("🗑️ Введите название сервиса для удаления:")
     
+    async def unlock_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработка команды /unlock"""
+        if context.args:
+            await self._unlock_vault(update, ' '.join(context.args))
+        else:
+            self.user_sessions[update.effective_user.id] = {'action': 'unlock'}
+            await update.message.reply_text("🔑 Введите мастер-пароль:")
+    
+    async def lock_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработка команды /lock"""
+        PasswordManager(update.effective_user.id).lock()
+        await update.message.reply_text("🔒 Хранилище заблокировано.")
+    
+    async def encrypt_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработка команды /encrypt"""
+        if context.args:
+            await self._encrypt_vault(update, ' '.join(context.args))
+        else:
+            self.user_sessions[update.effective_user.id] = {'action': 'encrypt'}
+            await update.message.reply_text("🔐 Введите новый мастер-пароль (не короче 8 символов):")
+    
+    async def totp_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработка команды /totp <сервис> <секрет>"""
+        if not context.args or len(context.args) < 2:
+            await update.message.reply_text("ℹ️ Использование: /totp <сервис> <base32-секрет или otpauth://...>")
+            return
+        
+        await self._delete_secret_message(update)
+        service, secret = ' '.join(context.args[:-1]), context.args[-1]
+        manager = PasswordManager(update.effective_user.id)
+        if manager.is_locked():
+            await update.effective_chat.send_message("🔒 Хранилище заблокировано. Используйте /unlock.")
+            return
+        
+        try:
+            uri = TotpEngine.build_uri(service, secret)
+            code, _ = totp_engine.code(uri)
+        except ValueError:
+            await update.effective_chat.send_message("❌ Некорректный TOTP-секрет.")
+            return
+        
+        if manager.set_totp(service, uri):
+            await update.effective_chat.send_message(f"✅ TOTP для '{service}' сохранен. Текущий код: {code}")
+        else:
+            await update.effective_chat.send_message(f"❌ Сервис '{service}' не найден. Сначала сохраните пароль: /save")
+    
+    async def codes_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработка команды /codes"""
+        manager = PasswordManager(update.effective_user.id)
+        if manager.is_locked():
+            await update.message.reply_text("🔒 Хранилище заблокировано. Используйте /unlock.")
+            return
+        
+        codes = totp_engine.codes(manager.totp_uris())
+        if not codes:
+            await update.message.reply_text("📭 Нет сервисов с TOTP. Добавьте: /totp <сервис> <секрет>")
+            return
+        
+        codes_text = "🔢 Коды двухфакторной аутентификации:\n\n"
+        for service, (code, seconds_left) in sorted(codes.items()):
+            line = f"{escape_markdown(service)}: `{code[:3]} {code[3:]}` (⏳ {seconds_left} с)\n"
+            # Длинный список делится на несколько сообщений по границам строк
+            if len(codes_text) + len(line) > MessageLimit.MAX_TEXT_LENGTH:
+                await update.message.reply_text(codes_text, parse_mode='Markdown')
+                codes_text = ""
+            codes_text += line
+        await update.message.reply_text(codes_text, parse_mode='Markdown')
+    
+    @staticmethod
+    def _parse_wifi_args(text: str, args: List[str]) -> Tuple[str, str]:
+        """Сеть и пароль из /qr wifi: сеть в кавычках — первое слово, иначе пароль — последнее слово"""
+        parts = (text or '').split(maxsplit=2)
+        if len(parts) == 3 and parts[2][:1] in '"\'':
+            try:
+                words = shlex.split(parts[2])
+            except ValueError:
+                words = []
+            if words:
+                return words[0], ' '.join(words[1:])
+        if len(args) == 1:
+            return args[0], ''
+        return ' '.join(args[:-1]), args[-1]
+    
+    async def qr_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработка команды /qr <сервис> | totp <сервис> | wifi <сеть> [пароль]"""
+        if not context.args:
+            await update.message.reply_text(
+                "ℹ️ Использование:\n/qr <сервис>\n/qr totp <сервис>\n/qr wifi <сеть> [пароль]")
+            return
+        if not QR_AVAILABLE:
+            await update.message.reply_text("❌ QR-коды недоступны: на сервере не установлен qrcode или pyqrcode.")
+            return
+        
+        kind = context.args[0].lower()
+        if kind == 'wifi':
+            if len(context.args) < 2:
+                await update.message.reply_text("ℹ️ Использование: /qr wifi <сеть> [пароль]")
+                return
+            await self._delete_secret_message(update)
+            ssid, password = self._parse_wifi_args(update.message.text, context.args[1:])
+            await self._send_qr(update.effective_chat, wifi_payload(ssid, password), f"📶 Wi-Fi: {ssid}")
+            return
+        
+        manager = PasswordManager(update.effective_user.id)
+        if manager.is_locked():
+            await update.message.reply_text("🔒 Хранилище заблокировано. Используйте /unlock.")
+            return
+        
+        if kind == 'totp':
+            service = ' '.join(context.args[1:])
+            uri = manager.totp_uris().get(service)
+            if uri is None:
+                await update.message.reply_text(f"❌ У сервиса '{service}' нет TOTP. Добавьте: /totp <сервис> <секрет>")
+                return
+            await self._send_qr(update.effective_chat, uri, f"🔢 TOTP: {service}")
+            return
+        
+        service = ' '.join(context.args)
+        password_data = manager.get_password(service, touch=False)
+        if not password_data:
+            await update.message.reply_text(f"❌ Пароль для '{service}' не найден.")
+            return
+        await self._send_qr(update.effective_chat, password_data['password'], f"🔐 {service}")
+    
+    async def _send_qr(self, chat, payload: str, caption: str):
+        """Отправка QR-кода из памяти: PNG рендерится в пуле потоков и кэшируется"""
+        try:
+            png_bytes = await qr_renderer.render_png_async(payload)
+        except Exception as e:
+            logger.error(f"Ошибка генерации QR: {e}")
+            await chat.send_message("❌ Не удалось построить QR-код.")
+            return
+        # bytes передаются как есть — без промежуточного файла и копирования
+        await chat.send_photo(photo=png_bytes, caption=caption, has_spoiler=True)
+    
+    async def import_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработка команды /import"""
+        await update.message.reply_text(
+            "📥 Отправьте файл экспорта паролей документом:\n"
+            "  • Chrome / Firefox — CSV\n"
+            "  • Bitwarden — CSV или JSON (без шифрования)\n"
+            "  • UnlockCode — JSON\n\n"
+            "Дубликаты будут пропущены, файл будет удален из чата после импорта."
+        )
+    
+    async def import_document(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Импорт паролей из присланного документа"""
+        document = update.message.document
+        if document.file_size and document.file_size > IMPORT_MAX_FILE_SIZE:
+            await update.message.reply_text("❌ Файл слишком большой (максимум 20 МБ).")
+            return
+        
+        manager = PasswordManager(update.effective_user.id)
+        if manager.is_locked():
+            await update.message.reply_text("🔒 Хранилище заблокировано. Используйте /unlock и отправьте файл снова.")
+            return
+        
+        status = await update.message.reply_text("⏳ Импорт паролей...")
+        tg_file = await document.get_file()
+        # Файл скачивается во временный файл и читается потоково, а не целиком строкой в памяти
+        with tempfile.TemporaryFile() as buffer:
+            await tg_file.download_to_memory(out=buffer)
+            buffer.seek(0)
+            await self._delete_secret_message(update)
+            
+            def run_import():
+                stream = io.TextIOWrapper(buffer, encoding='utf-8-sig', newline='')
+                try:
+                    return PasswordImporter(manager).import_stream(stream)
+                finally:
+                    stream.detach()
+            
+            try:
+                report = await asyncio.to_thread(run_import)
+            except (ValueError, UnicodeDecodeError, csv.Error) as e:
+                await status.edit_text(f"❌ Не удалось разобрать файл: {e}")
+                return
+        
+        if report.get('error') == 'locked':
+            await status.edit_text("🔒 Хранилище заблокировано. Используйте /unlock и отправьте файл снова.")
+            return
+        if report.get('error'):
+            await status.edit_text("❌ Ошибка сохранения импортированных паролей.")
+            return
+        await status.edit_text(
+            f"✅ Импорт завершен ({report['format']}):\n\n"
+            f"📥 Добавлено: {report['imported']}\n"
+            f"✏️ Переименовано (несколько аккаунтов): {report['renamed']}\n"
+            f"♻️ Дубликаты: {report['duplicates']}\n"
+            f"⚠️ Пропущено некорректных: {report['invalid']}"
+        )
+    
+    async def inline_query_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработка inline-запроса: варианты паролей из пула без ожидания генерации"""
+        query = update.inline_query
+        text = query.query.strip()
+        length = int(text) if text.isdigit() else INLINE_DEFAULT_LENGTH
+        length = max(4, min(length, 64))
+        
+        titles = {
+            'simple': "🔐 Простой",
+            'strong': "💪 Сложный",
+            'advanced': "🎲 Случайный",
+            'passphrase': "🗣️ Пасфраза"
+        }
+        results = []
+        for policy in PasswordPool.POLICIES:
+            password, strength = self.password_pool.take(policy, length)
+            results.append(InlineQueryResultArticle(
+                id=secrets.token_hex(8),
+                title=f"{titles[policy]} — {strength}",
+                description=password,
+                input_message_content=InputTextMessageContent(password)
+            ))
+        
+        usage_rollup.record("inline", update.effective_user.id)
+        # cache_time=0: Telegram не должен раздавать одни и те же пароли разным пользователям
+        await query.answer(results, cache_time=0, is_personal=True)
+    
+    async def pool_stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработка команды /poolstats"""
+        stats = self.password_pool.snapshot()
+        await update.message.reply_text(
+            "🏊 Пул паролей inline-режима:\n\n"
+            f"📦 Пулов: {stats['pools']} (глубина {stats['depth']})\n"
+            f"🔋 Заполнено: {stats['filled']} из {stats['pools'] * stats['depth']}\n"
+            f"🎯 Попадания: {stats['hits']}, промахи: {stats['misses']} ({stats['hit_rate']}%)\n"
+            f"⚙️ Сгенерировано всего: {stats['generated']}\n"
+            f"⏱️ Пополнение: до {stats['refill_batch']} паролей каждые {stats['refill_interval']} с"
+        )
+    
     async def button_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка нажатий кнопок"""
         query = update.callback_query
@@ -573,8 +2642,21 @@ class PasswordGeneratorBot:
             await query.edit_message_text("💾 Менеджер паролей:", reply_markup=reply_markup)
         elif data.startswith("manager_"):
             await self._handle_manager(query, data, user_id)
+        elif data.startswith("list_page_"):
+            services_text, reply_markup = self._render_service_page(user_id, int(data.replace("list_page_", "")))
+            await query.edit_message_text(services_text, reply_markup=reply_markup)
+        elif data.startswith("pick_"):
+            await self._handle_service_pick(query, data, user_id)
         elif data.startswith("transform_"):
             await self._handle_transformation(query, data, user_id)
+        elif data.startswith("save_gen_"):
+            await self._handle_save_generated(query, data, user_id)
+        elif data.startswith("qr_gen_"):
+            password = self.generated_passwords.peek(user_id, data.replace("qr_gen_", "", 1))
+            if password is None:
+                await query.message.reply_text("⌛ Кнопка устарела. Сгенерируйте пароль заново.")
+            else:
+                await self._send_qr(query.message.chat, password, "📷 Сгенерированный пароль")
     
     async def _handle_generation(self, query, data: str, user_id: int):
         """Обработка генерации пароля"""
@@ -595,6 +2677,12 @@ class PasswordGeneratorBot:
             strength = generator.analyze_password(password)['strength']
             response = f"🎲 Случайный пароль:\n`{password}`\n\n💪 Сложность: {strength}"
             
+        elif data == "gen_pronounceable":
+            password, bits = generator.generate_pronounceable_password()
+            strength = generator.analyze_password(password)['strength']
+            response = (f"🗣️ Произносимый пароль:\n`{password}`\n\n💪 Сложность: {strength}\n"
+                        f"🔢 Энтропия: {bits:.1f} бит (с учетом предсказуемости слогов)")
+            
         elif data == "gen_custom":
             self.user_sessions[user_id] = {'action': 'gen_custom_length'}
             await query.edit_message_text("📏 Введите длину пароля:")
@@ -606,16 +2694,38 @@ class PasswordGeneratorBot:
             return
         
         # Кнопки для сохранения
+        token = self.generated_passwords.put(user_id, password)
         keyboard = [
             [
-                InlineKeyboardButton("💾 Сохранить этот пароль", callback_data=f"save_gen_{password}"),
+                InlineKeyboardButton("💾 Сохранить этот пароль", callback_data=f"save_gen_{token}"),
                 InlineKeyboardButton("🔄 Сгенерировать еще", callback_data="gen_random")
+            ],
+            [
+                InlineKeyboardButton("📷 QR-код", callback_data=f"qr_gen_{token}")
             ]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await query.edit_message_text(response, reply_markup=reply_markup, parse_mode='Markdown')
     
+    async def _handle_save_generated(self, query, data: str, user_id: int):
+        """Сохранение сгенерированного пароля по короткому токену"""
+        password = self.generated_passwords.pop(user_id, data.replace("save_gen_", "", 1))
+        if password is None:
+            await query.edit_message_text("⌛ Кнопка устарела. Сгенерируйте пароль заново.")
+            return
+        
+        if PasswordManager(user_id).is_locked():
+            await query.edit_message_text("🔒 Хранилище заблокировано. Используйте /unlock и сгенерируйте пароль заново.")
+            return
+        
+        self.user_sessions[user_id] = {
+            'action': 'save_password',
+            'step': 1,
+            'password': password
+        }
+        await query.edit_message_text("💾 Сохранение сгенерированного пароля.\nВведите название сервиса:")
+    
     async def _handle_manager(self, query, data: str, user_id: int):
         """Обработка менеджера паролей"""
         if data == "manager_save":
@@ -626,18 +2736,8 @@ class PasswordGeneratorBot:
             await query.edit_message_text("💾 Сохранение пароля.\nВведите название сервиса:")
             
         elif data == "manager_list":
-            generator = AdvancedPasswordGenerator(user_id)
-            services = generator.password_manager.list_services()
-            
-            if not services:
-                await query.edit_message_text("📭 Нет сохраненных паролей.")
-                return
-            
-            services_text = "💼 Сохраненные сервисы:\n\n"
-            for i, service in enumerate(services, 1):
-                services_text += f"{i}. {service}\n"
-            
-            await query.edit_message_text(services_text)
+            services_text, reply_markup = self._render_service_page(user_id, 0)
+            await query.edit_message_text(services_text, reply_markup=reply_markup)
             
         elif data == "manager_get":
             self.user_sessions[user_id] = {'action': 'get_password'}
@@ -684,13 +2784,13 @@ class PasswordGeneratorBot:
         user_id = update.effective_user.id
         text = update.message.text
         
-        if user_id not in self.user_sessions:
+        session = self.user_sessions.get(user_id, {})
+        action = session.get('action')
+        # Сессия без действия (например, только с предложенными совпадениями) текст не ждет
+        if not action:
             await update.message.reply_text("Используйте команды или кнопки для работы с ботом.")
             return
         
-        session = self.user_sessions[user_id]
-        action = session.get('action')
-        
         if action == 'analyze':
             await self._analyze_password(update, text)
             del self.user_sessions[user_id]
@@ -699,18 +2799,27 @@ class PasswordGeneratorBot:
             await self._handle_save_password(update, text, session)
             
         elif action == 'get_password':
-            await self._get_password(update, text)
+            # Сессия закрывается до поиска, чтобы не стереть предложенные совпадения
             del self.user_sessions[user_id]
+            await self._get_password(update, text)
             
         elif action == 'delete_password':
-            await self._delete_password(update, text)
             del self.user_sessions[user_id]
+            await self._delete_password(update, text)
             
         elif action == 'transform':
             await self._show_transform_options(update, text)
             
         elif action in ['gen_custom_length', 'gen_length']:
             await self._handle_custom_generation(update, text, action, user_id)
+            
+        elif action == 'unlock':
+            await self._unlock_vault(update, text)
+            del self.user_sessions[user_id]
+            
+        elif action == 'encrypt':
+            await self._encrypt_vault(update, text)
+            del self.user_sessions[user_id]
     
     async def _analyze_password(self, update, password: str):
         """Анализ пароля"""
@@ -734,7 +2843,7 @@ class PasswordGeneratorBot:
                 char_display = repr(char)[1:-1]
                 response += f"  '{char_display}': {freq:.1f}%\n"
         
-        if hasattr(update, 'message'):
+        if isinstance(update, Update):
             await update.message.reply_text(response)
         else:
             await update.edit_message_text(response)
@@ -751,6 +2860,10 @@ class PasswordGeneratorBot:
             
         elif step == 2:  # Логин
             session['login'] = text
+            if 'password' in session:  # пароль уже известен (сохранение сгенерированного)
+                session['step'] = 4
+                await update.message.reply_text("📝 Введите заметки (или отправьте '-' чтобы пропустить):")
+                return
             session['step'] = 3
             await update.message.reply_text("🔐 Введите пароль:")
             
@@ -763,6 +2876,11 @@ class PasswordGeneratorBot:
             notes = text if text != '-' else ""
             
             generator = AdvancedPasswordGenerator(user_id)
+            if generator.password_manager.is_locked():
+                await update.message.reply_text("🔒 Хранилище заблокировано. Используйте /unlock и повторите /save.")
+                del self.user_sessions[user_id]
+                return
+            
             success = generator.password_manager.save_password(
                 session['service'],
                 session['login'],
@@ -784,9 +2902,15 @@ class PasswordGeneratorBot:
         """Получение пароля по сервису"""
         user_id = update.effective_user.id if hasattr(update, 'effective_user') else update.from_user.id
         generator = AdvancedPasswordGenerator(user_id)
-        password_data = generator.password_manager.get_password(service)
+        manager = generator.password_manager
+        if service not in manager.passwords and not manager.is_locked():
+            await self._offer_matches(update, user_id, manager, service, 'get')
+            return
+        password_data = manager.get_password(service)
         
-        if password_data:
+        if manager.is_locked():
+            response = "🔒 Хранилище заблокировано. Используйте /unlock <мастер-пароль>."
+        elif password_data:
             response = f"🔍 Найден пароль для '{service}':\n\n"
             response += f"👤 Логин: `{password_data['login']}`\n"
             response += f"🔐 Пароль: `{password_data['password']}`\n"
@@ -796,7 +2920,7 @@ class PasswordGeneratorBot:
         else:
             response = f"❌ Пароль для '{service}' не найден."
         
-        if hasattr(update, 'message'):
+        if isinstance(update, Update):
             await update.message.reply_text(response, parse_mode='Markdown')
         else:
             await update.edit_message_text(response, parse_mode='Markdown')
@@ -805,11 +2929,112 @@ class PasswordGeneratorBot:
         """Удаление пароля"""
         user_id = update.effective_user.id
         generator = AdvancedPasswordGenerator(user_id)
+        manager = generator.password_manager
         
-        if generator.password_manager.delete_password(service):
+        if manager.delete_password(service):
             await update.message.reply_text(f"✅ Пароль для '{service}' удален.")
         else:
-            await update.message.reply_text(f"❌ Пароль для '{service}' не найден.")
+            await self._offer_matches(update, user_id, manager, service, 'delete')
+    
+    async def _offer_matches(self, update, user_id: int, manager: PasswordManager, query_text: str, action: str):
+        """Предложить похожие сервисы, если точного совпадения нет"""
+        matches = manager.search_index().search(query_text, SEARCH_RESULTS_LIMIT)
+        if not matches:
+            response, reply_markup = f"❌ Пароль для '{query_text}' не найден.", None
+        else:
+            # В callback_data передается только номер совпадения, имена остаются в сессии;
+            # начатый диалог (например, /save) при этом не сбрасывается
+            self.user_sessions.setdefault(user_id, {})['matches'] = matches
+            icon = "🔍" if action == 'get' else "🗑️"
+            keyboard = [[InlineKeyboardButton(f"{icon} {name}"[:64], callback_data=f"pick_{action}_{i}")]
+                        for i, name in enumerate(matches)]
+            response = f"❓ Точного совпадения для '{query_text}' нет. Похожие сервисы:"
+            reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        if isinstance(update, Update):
+            await update.message.reply_text(response, reply_markup=reply_markup)
+        else:
+            await update.edit_message_text(response, reply_markup=reply_markup)
+    
+    async def _handle_service_pick(self, query, data: str, user_id: int):
+        """Обработка выбора сервиса из найденных совпадений"""
+        _, action, number = data.split("_", 2)
+        matches = self.user_sessions.get(user_id, {}).get('matches', [])
+        if not number.isdigit() or int(number) >= len(matches):
+            await query.edit_message_text("⌛ Результаты поиска устарели, повторите запрос.")
+            return
+        
+        service = matches[int(number)]
+        if action == 'get':
+            await self._get_password(query, service)
+        elif action == 'delete':
+            if AdvancedPasswordGenerator(user_id).password_manager.delete_password(service):
+                await query.edit_message_text(f"✅ Пароль для '{service}' удален.")
+            else:
+                await query.edit_message_text(f"❌ Пароль для '{service}' не найден.")
+        session = self.user_sessions.get(user_id, {})
+        session.pop('matches', None)
+        if not session:
+            self.user_sessions.pop(user_id, None)
+    
+    def _render_service_page(self, user_id: int, page: int):
+        """Страница списка сервисов с кнопками навигации"""
+        index = PasswordManager(user_id).search_index()
+        total = len(index)
+        if not total:
+            return "📭 Нет сохраненных паролей.", None
+        
+        pages = (total + LIST_PAGE_SIZE - 1) // LIST_PAGE_SIZE
+        page = max(0, min(page, pages - 1))
+        offset = page * LIST_PAGE_SIZE
+        
+        services_text = f"💼 Сохраненные сервисы ({total}), стр. {page + 1}/{pages}:\n\n"
+        for i, service in enumerate(index.page(offset, LIST_PAGE_SIZE), offset + 1):
+            services_text += f"{i}. {service}\n"
+        
+        buttons = []
+        if page > 0:
+            buttons.append(InlineKeyboardButton("◀️ Назад", callback_data=f"list_page_{page - 1}"))
+        if page < pages - 1:
+            buttons.append(InlineKeyboardButton("Вперед ▶️", callback_data=f"list_page_{page + 1}"))
+        return services_text, InlineKeyboardMarkup([buttons]) if buttons else None
+    
+    async def _unlock_vault(self, update, master_password: str):
+        """Разблокировка хранилища мастер-паролем"""
+        await self._delete_secret_message(update)
+        manager = PasswordManager(update.effective_user.id)
+        
+        if not manager.is_encrypted():
+            await update.effective_chat.send_message("ℹ️ Хранилище не зашифровано. Используйте /encrypt.")
+        elif await asyncio.to_thread(manager.unlock, master_password):  # scrypt не должен блокировать цикл событий
+            minutes = vault_keys.ttl // 60
+            await update.effective_chat.send_message(f"🔓 Хранилище разблокировано на {minutes} мин. бездействия.")
+        else:
+            await update.effective_chat.send_message("❌ Неверный мастер-пароль.")
+    
+    async def _encrypt_vault(self, update, master_password: str):
+        """Включение шифрования или смена мастер-пароля"""
+        await self._delete_secret_message(update)
+        manager = PasswordManager(update.effective_user.id)
+        
+        if len(master_password) < 8:
+            await update.effective_chat.send_message("❌ Мастер-пароль должен быть не короче 8 символов.")
+        elif manager.is_locked():
+            await update.effective_chat.send_message("🔒 Сначала разблокируйте хранилище: /unlock <текущий мастер-пароль>")
+        elif await asyncio.to_thread(manager.rotate_key, master_password):  # scrypt и перешифрование всех записей
+            await update.effective_chat.send_message(
+                f"✅ Хранилище зашифровано ({len(manager.passwords)} записей).\n"
+                "⚠️ Мастер-пароль нельзя восстановить — не забудьте его!"
+            )
+        else:
+            await update.effective_chat.send_message("❌ Не удалось перешифровать хранилище.")
+    
+    async def _delete_secret_message(self, update):
+        """Удаление сообщения с мастер-паролем из чата"""
+        try:
+            await update.message.delete()
+        except Exception as e:
+            logger.warning(f"Не удалось удалить сообщение с мастер-паролем: {e}")
     
     async def _show_transform_options(self, update, password: str):
         """Показать варианты преобразования"""
@@ -834,7 +3059,7 @@ class PasswordGeneratorBot:
         
         response = f"🔄 Выберите тип преобразования для пароля:\n`{password}`"
         
-        if hasattr(update, 'message'):
+        if isinstance(update, Update):
             await update.message.reply_text(response, reply_markup=reply_markup, parse_mode='Markdown')
         else:
             await update.edit_message_text(response, reply_markup=reply_markup, parse_mode='Markdown')
@@ -859,10 +3084,16 @@ class PasswordGeneratorBot:
             strength = generator.analyze_password(password)['strength']
             response = f"🔐 Пароль ({length} символов):\n`{password}`\n\n💪 Сложность: {strength}"
             
-            keyboard = [[
-                InlineKeyboardButton("💾 Сохранить", callback_data=f"save_gen_{password}"),
-                InlineKeyboardButton("🔄 Еще", callback_data="gen_random")
-            ]]
+            token = self.generated_passwords.put(user_id, password)
+            keyboard = [
+                [
+                    InlineKeyboardButton("💾 Сохранить", callback_data=f"save_gen_{token}"),
+                    InlineKeyboardButton("🔄 Еще", callback_data="gen_random")
+                ],
+                [
+                    InlineKeyboardButton("📷 QR-код", callback_data=f"qr_gen_{token}")
+                ]
+            ]
             reply_markup = InlineKeyboardMarkup(keyboard)
             
             await update.message.reply_text(response, reply_markup=reply_markup, parse_mode='Markdown')
@@ -871,13 +3102,536 @@ class PasswordGeneratorBot:
         except ValueError:
             await update.message.reply_text("❌ Введите корректное число.")
     
-    def run(self):
-        """Запуск бота"""
+    async def serve_queue(self, worker_name: str, updates, acks):
+        """Режим воркера: обработка обновлений из очереди диспетчера"""
+        await self.application.initialize()
+        await self._post_init(self.application)
+        loop = asyncio.get_running_loop()
+        inbox = asyncio.Queue()
+        
+        def read_queue():
+            # Отдельный поток читает межпроцессную очередь и не занимает пул потоков to_thread
+            while True:
+                payload = updates.get()
+                loop.call_soon_threadsafe(inbox.put_nowait, payload)
+                if payload is None:
+                    return
+        
+        threading.Thread(target=read_queue, name=f"{worker_name}-queue", daemon=True).start()
+        logger.info(f"{worker_name} запущен")
+        
+        in_flight = {}  # задача -> user_id
+        incoming = {}  # воркер, от которого едут пользователи -> их отложенные обновления
+        incoming_ring = None  # кольцо до перебалансировки: по нему видно, чей пользователь
+
+        def start(update: Update, user_id: Optional[int]):
+            task = asyncio.create_task(self._process_queued(worker_name, update))
+            in_flight[task] = user_id
+            task.add_done_callback(lambda done: in_flight.pop(done, None))
+
+        async def hand_off(token: str, ring: 'HashRing'):
+            def moved(user_id):
+                return ring.node_for(str(user_id)) != worker_name
+            # Ждем только начатые обновления уходящих пользователей, остальные обрабатываются дальше
+            tasks = [task for task, user_id in in_flight.items() if user_id is not None and moved(user_id)]
+            if tasks:
+                await asyncio.wait(tasks)
+            acks.put((worker_name, token, self.export_user_state(moved)))
+
+        while True:
+            payload = await inbox.get()
+            if payload is None:  # воркер выводится из кольца: очередь уже опустошена
+                break
+            if 'expect' in payload:
+                # Пользователи переезжают сюда: их обновления ждут, пока придет состояние от прежнего воркера
+                incoming_ring = payload['ring']
+                for source in payload['sources']:
+                    incoming[source] = []
+                continue
+            if 'handoff' in payload:
+                task = asyncio.create_task(hand_off(payload['handoff'], payload['ring']))
+                in_flight[task] = None
+                task.add_done_callback(lambda done: in_flight.pop(done, None))
+                continue
+            if 'adopt' in payload:
+                self.adopt_user_state(payload['states'])
+                for update, user_id in incoming.pop(payload['from'], []):
+                    start(update, user_id)
+                continue
+            update = Update.de_json(payload, self.application.bot)
+            user_id = update.effective_user.id if update.effective_user else None
+            if incoming and user_id is not None:
+                pending = incoming.get(incoming_ring.node_for(str(user_id)))
+                if pending is not None:
+                    pending.append((update, user_id))
+                    continue
+            # Каждое обновление — отдельная задача; порядок внутри пользователя держит UserLockUpdateProcessor
+            start(update, user_id)
+        
+        if in_flight:
+            await asyncio.wait(set(in_flight))
+        await self.application.shutdown()
+        logger.info(f"{worker_name} остановлен")
+    
+    def export_user_state(self, moved) -> Dict[int, Dict]:
+        """Забрать состояние пользователей, уходящих к другому воркеру: диалог, токены паролей, ключ хранилища"""
+        states = {}
+        for user_id in [user_id for user_id in self.user_sessions if moved(user_id)]:
+            states.setdefault(user_id, {})['session'] = self.user_sessions.pop(user_id)
+        for user_id, tokens in self.generated_passwords.take(moved).items():
+            states.setdefault(user_id, {})['tokens'] = tokens
+        for name in vault_keys.names():
+            match = USER_FILE_PATTERN.fullmatch(os.path.basename(name))
+            if match and moved(int(match.group(1))):
+                entry = vault_keys.take(name)
+                if entry:
+                    states.setdefault(int(match.group(1)), {})['vault'] = (name, *entry)
+        return states
+    
+    def adopt_user_state(self, states: Dict[int, Dict]):
+        for user_id, state in states.items():
+            if 'session' in state:
+                self.user_sessions[user_id] = state['session']
+            if 'tokens' in state:
+                self.generated_passwords.adopt(user_id, state['tokens'])
+            if 'vault' in state:
+                vault_keys.adopt(*state['vault'])
+    
+    async def _process_queued(self, worker_name: str, update: Update):
+        try:
+            await self.application.update_processor.process_update(update, self.application.process_update(update))
+        except Exception as e:
+            logger.error(f"{worker_name}: ошибка обработки обновления: {e}")
+    
+    def run(self, webhook_url: Optional[str] = None, webhook_port: int = 8443):
+        """Запуск бота: long polling или webhook (нужен python-telegram-bot[webhooks])"""
         logger.info("Бот запущен...")
+        if webhook_url:
+            self.application.run_webhook(listen="0.0.0.0", port=webhook_port,
+                                         url_path=urlsplit(webhook_url).path.lstrip('/'),
+                                         webhook_url=webhook_url, allowed_updates=Update.ALL_TYPES)
+            return
         self.application.run_polling(allowed_updates=Update.ALL_TYPES)
 #ТЕЛЕГРАММ БОТ
 
+# ==================== МАСШТАБИРОВАНИЕ: ВОРКЕРЫ ====================
+
+class HashRing:
+    """Консистентное хеширование: каждый пользователь закреплен за одним воркером"""
+
+    def __init__(self, vnodes: int = 64):
+        self.vnodes = vnodes
+        self._hashes = []
+        self._nodes = []
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+    def __len__(self):
+        return len(set(self._nodes))
+
+    def add(self, node: str):
+        for i in range(self.vnodes):
+            point = self._hash(f"{node}#{i}")
+            pos = bisect_left(self._hashes, point)
+            self._hashes.insert(pos, point)
+            self._nodes.insert(pos, node)
+
+    def remove(self, node: str):
+        kept = [(h, n) for h, n in zip(self._hashes, self._nodes) if n != node]
+        self._hashes = [h for h, _ in kept]
+        self._nodes = [n for _, n in kept]
+
+    def node_for(self, key: str) -> str:
+        return self._node_at(self._hash(key))
+
+    def _node_at(self, point: int) -> str:
+        return self._nodes[bisect_left(self._hashes, point) % len(self._hashes)]
+
+    def copy(self) -> 'HashRing':
+        ring = HashRing(self.vnodes)
+        ring._hashes, ring._nodes = list(self._hashes), list(self._nodes)
+        return ring
+
+    @staticmethod
+    def moves(old: 'HashRing', new: 'HashRing') -> Dict[str, set]:
+        """Откуда и куда переезжают пользователи: источник -> {получатели}.
+
+        Между соседними точками обоих колец владелец в каждом кольце один и тот же,
+        поэтому достаточно сравнить владельцев в самих точках.
+        """
+        result = {}
+        if not old._hashes or not new._hashes:
+            return result
+        for point in set(old._hashes) | set(new._hashes):
+            source, target = old._node_at(point), new._node_at(point)
+            if source != target:
+                result.setdefault(source, set()).add(target)
+        return result
+
+
+WORKER_DRAIN_TIMEOUT = float(os.getenv("WORKER_DRAIN_TIMEOUT", "60"))  # секунд ожидания состояния при перебалансировке
+WORKER_RECENT_USERS = 10000  # недавних пользователей на воркер, которых предупредить, если он упадет
+
+
+def run_worker(worker_name: str, token: str, updates, acks, api_url: Optional[str] = None):
+    """Точка входа процесса-воркера"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # остановкой управляет диспетчер
+    usage_rollup.shard = worker_name
+    bot = PasswordGeneratorBot(token, api_url, file_locks=True)
+    asyncio.run(bot.serve_queue(worker_name, updates, acks))
+
+
+class ShardedDispatcher:
+    """Получает обновления и раздает их воркерам по user_id; число воркеров меняется на лету.
+
+    При смене владельцев (SIGUSR1/SIGUSR2) маршрутизация не останавливается: новое кольцо
+    применяется сразу, прежний владелец дорабатывает начатое и передает состояние переехавших
+    пользователей (диалоги, ключи разблокированных хранилищ, токены кнопок «Сохранить» и «QR»),
+    а новый откладывает их обновления до прихода состояния. Затронуты только воркеры, чьи
+    участки кольца меняются. Состояние упавшего воркера потеряно — его недавние пользователи
+    получают сообщение, что действие нужно повторить.
+    """
+
+    def __init__(self, token: str, workers: int, api_url: Optional[str] = None):
+        self.token = token
+        self.api_url = api_url
+        self.initial_workers = workers
+        self.ctx = multiprocessing.get_context("spawn")
+        self.ring = HashRing()
+        self.workers = {}  # имя -> (процесс, очередь)
+        self.retiring = []  # выведенные из кольца воркеры, дорабатывающие свою очередь
+        self.acks = self.ctx.Queue()  # состояние пользователей, которое воркеры отдают при перебалансировке
+        self.bot = None
+        self._recent = {}  # воркер -> OrderedDict(user_id -> (chat_id, время последнего обновления))
+        self._routing = None  # asyncio.Lock: смена кольца не попадает в середину раздачи пачки
+        self._rebalancing = None  # asyncio.Lock: перебалансировки идут по одной
+        self._next_id = 0
+
+    def _spawn(self, name: str):
+        updates = self.ctx.Queue()
+        process = self.ctx.Process(target=run_worker, args=(name, self.token, updates, self.acks, self.api_url),
+                                   name=name, daemon=True)
+        process.start()
+        self.workers[name] = (process, updates)
+
+    async def _rebalance(self, change, retire: str = None):
+        """Применить change к копии кольца и перевезти состояние пользователей, сменивших воркер"""
+        async with self._rebalancing:
+            old = self.ring
+            new = old.copy()
+            change(new)
+            moves = HashRing.moves(old, new)
+            token = secrets.token_hex(4)
+            async with self._routing:
+                # Метки встают в очереди ровно между обновлениями, отправленными по старому и по новому кольцу
+                targets = {}
+                for source, receivers in moves.items():
+                    for target in receivers:
+                        targets.setdefault(target, []).append(source)
+                for target, sources in targets.items():
+                    self.workers[target][1].put({'expect': token, 'sources': sources, 'ring': old})
+                for source in moves:
+                    self.workers[source][1].put({'handoff': token, 'ring': new})
+                self.ring = new
+                self._move_recent(moves, new)
+                if retire:
+                    process, updates = self.workers.pop(retire)
+                    updates.put(None)  # после передачи состояния воркер завершится
+                    self.retiring.append(process)
+            await self._collect_handoffs(token, moves, new)
+
+    async def _collect_handoffs(self, token: str, moves: Dict[str, set], ring: HashRing):
+        """Переслать состояние от прежних владельцев новым; по таймауту получатели перестают ждать"""
+        waiting = set(moves)
+        deadline = time.monotonic() + WORKER_DRAIN_TIMEOUT
+        while waiting:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                logger.warning(f"Воркеры {sorted(waiting)} не передали состояние за {WORKER_DRAIN_TIMEOUT} с, "
+                               "их переехавшие пользователи продолжат без него")
+                break
+            try:
+                source, acked, states = await asyncio.to_thread(self.acks.get, True, min(timeout, 1.0))
+            except queue.Empty:
+                continue
+            if acked != token or source not in waiting:
+                continue
+            waiting.discard(source)
+            self._deliver(token, source, moves[source], ring, states)
+            logger.info(f"{source}: передано состояние {len(states)} пользователей")
+        for source in waiting:
+            self._deliver(token, source, moves[source], ring, {})
+
+    def _deliver(self, token: str, source: str, receivers: set, ring: HashRing, states: Dict[int, Dict]):
+        grouped = {target: {} for target in receivers}
+        for user_id, state in states.items():
+            grouped.setdefault(ring.node_for(str(user_id)), {})[user_id] = state
+        for target, group in grouped.items():
+            if target in self.workers:
+                self.workers[target][1].put({'adopt': token, 'from': source, 'states': group})
+
+    def _move_recent(self, moves: Dict[str, set], ring: HashRing):
+        for source in moves:
+            recent = self._recent.get(source, {})
+            for user_id in [user_id for user_id in recent if ring.node_for(str(user_id)) != source]:
+                self._remember(ring.node_for(str(user_id)), user_id, *recent.pop(user_id))
+
+    def _remember(self, name: str, user_id: int, chat_id: int, seen: float):
+        recent = self._recent.setdefault(name, OrderedDict())
+        recent[user_id] = (chat_id, seen)
+        recent.move_to_end(user_id)
+        if len(recent) > WORKER_RECENT_USERS:
+            recent.popitem(last=False)
+
+    async def add_worker(self, initial: bool = False):
+        name = f"worker-{self._next_id}"
+        self._next_id += 1
+        self._spawn(name)
+        if initial:  # обновлений еще не было — переезжать некому
+            self.ring.add(name)
+        else:
+            await self._rebalance(lambda ring: ring.add(name))
+        logger.info(f"Добавлен {name}, воркеров: {len(self.workers)}")
+
+    async def remove_worker(self):
+        if len(self.workers) <= 1:
+            return
+        name = max(self.workers, key=lambda n: int(n.split('-')[1]))
+        await self._rebalance(lambda ring: ring.remove(name), retire=name)
+        self._recent.pop(name, None)
+        logger.info(f"{name} выведен, воркеров: {len(self.workers)}")
+
+    def route(self, update: Update):
+        user = update.effective_user
+        key = str(user.id) if user else str(update.update_id)
+        name = self.ring.node_for(key)
+        self.workers[name][1].put(update.to_dict())
+        if user:
+            chat_id = update.effective_chat.id if update.effective_chat else user.id
+            self._remember(name, user.id, chat_id, time.monotonic())
+
+    def _check_workers(self):
+        # Упавший воркер перезапускается под тем же именем, кольцо не меняется
+        for name, (process, _) in list(self.workers.items()):
+            if not process.is_alive():
+                logger.error(f"{name} завершился с кодом {process.exitcode}, перезапуск; "
+                             "состояние его пользователей (диалоги, разблокировка хранилищ) потеряно")
+                # Очередь новая: упавший процесс мог умереть, держа ее внутреннюю блокировку чтения.
+                # Обновления из старой очереди теряются, их отправители есть среди предупреждаемых
+                self._spawn(name)
+                asyncio.get_running_loop().create_task(self._notify_lost(name))
+        self.retiring = [p for p in self.retiring if p.is_alive()]
+
+    async def _notify_lost(self, name: str):
+        """Предупредить недавних пользователей упавшего воркера, что начатое действие сброшено"""
+        since = time.monotonic() - VAULT_SESSION_TTL
+        chats = [chat_id for chat_id, seen in self._recent.pop(name, {}).values() if seen >= since]
+        for chat_id in chats:
+            try:
+                await self.bot.send_message(
+                    chat_id, "⚠️ Бот перезапустился: начатое действие сброшено. Повторите команду; "
+                             "если хранилище было разблокировано, снова используйте /unlock.")
+            except Exception as e:
+                logger.warning(f"Не удалось предупредить чат {chat_id}: {e}")
+            await asyncio.sleep(0.05)  # не упираться в лимит Bot API на рассылку
+
+    async def run(self):
+        self._routing = asyncio.Lock()
+        self._rebalancing = asyncio.Lock()
+        for _ in range(self.initial_workers):
+            await self.add_worker(initial=True)
+
+        loop = asyncio.get_running_loop()
+        if hasattr(signal, 'SIGUSR1'):
+            loop.add_signal_handler(signal.SIGUSR1, lambda: loop.create_task(self.add_worker()))
+            loop.add_signal_handler(signal.SIGUSR2, lambda: loop.create_task(self.remove_worker()))
+
+        offset = None
+        try:
+            bot_kwargs = {'base_url': self.api_url} if self.api_url else {}
+            async with Bot(self.token, **bot_kwargs) as bot:
+                self.bot = bot
+                while True:
+                    try:
+                        updates = await bot.get_updates(offset=offset, timeout=30,
+                                                        allowed_updates=Update.ALL_TYPES)
+                    except Exception as e:
+                        logger.error(f"Ошибка получения обновлений: {e}")
+                        await asyncio.sleep(1)
+                        continue
+                    async with self._routing:
+                        for update in updates:
+                            self.route(update)
+                            offset = update.update_id + 1
+                        self._check_workers()
+        finally:
+            for process, updates in self.workers.values():
+                updates.put(None)
+            for process in [p for p, _ in self.workers.values()] + self.retiring:
+                process.join(timeout=10)
+
+    def start(self):
+        logger.info(f"Диспетчер запущен: {self.initial_workers} воркеров (SIGUSR1 +1, SIGUSR2 -1)")
+        try:
+            asyncio.run(self.run())
+        except KeyboardInterrupt:
+            logger.info("Диспетчер остановлен")
+
+def run_import_cli(args):
+    """Импорт файла экспорта в хранилище из командной строки"""
+    lock = UserFileLock(args.user)
+    if not lock.acquire():
+        print("❌ Хранилище занято ботом, попробуйте позже.")
+        return 1
+    try:
+        manager = PasswordManager(args.user)
+        if manager.is_locked() and not manager.unlock(getpass.getpass("Мастер-пароль: ")):
+            print("❌ Неверный мастер-пароль.")
+            return 1
+        
+        started = time.perf_counter()
+        report = PasswordImporter(manager).import_file(args.file, args.format)
+    except (OSError, ValueError, csv.Error) as e:
+        print(f"❌ Ошибка импорта: {e}")
+        return 1
+    finally:
+        lock.release()
+    if report.get('error') == 'locked':
+        print("🔒 Хранилище заблокировано: нужен мастер-пароль.")
+        return 1
+    if report.get('error'):
+        print("❌ Ошибка сохранения импортированных паролей.")
+        return 1
+    
+    print(f"✅ Импорт ({report['format']}) за {time.perf_counter() - started:.2f} с: "
+          f"добавлено {report['imported']}, переименовано {report['renamed']}, "
+          f"дубликатов {report['duplicates']}, некорректных {report['invalid']}")
+    return 0
+
+def run_issue_cli(args):
+    """Выпуск или проверка уникальных кодов серии из командной строки"""
+    try:
+        if args.verify:
+            series = CodeSeries(args.series, create=False)
+            valid = 0
+            for code in args.verify:
+                index = series.verify(code)
+                valid += index is not None
+                print(f"{code}\t{'✅ выдан, №' + str(index) if index is not None else '❌ не выдавался'}")
+            return 0 if valid == len(args.verify) else 1
+        series = CodeSeries(args.series, args.alphabet, args.length)
+        left = series.capacity - series.issued()
+        if args.count > left:
+            raise ValueError(f"В серии {series.name} осталось {left} кодов, запрошено {args.count}")
+        out = sys.stdout.buffer
+        remaining = args.count
+        while remaining > 0:
+            # Крупные выпуски идут диапазонами: память не растет с числом кодов
+            size = min(remaining, CODE_ISSUE_CHUNK)
+            codes = series.issue(size)
+            out.write(''.join(CodeSeries.format_code(code, args.group) + '\n' for code in codes).encode('utf-8'))
+            remaining -= size
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    return 0
+
+def run_snapshot_cli(args):
+    """Создание, список и очистка снимков user_data из командной строки"""
+    try:
+        if args.list:
+            for manifest in snapshot_store.manifests():
+                print(f"{manifest['id']}\t{manifest['created']}\tфайлов {manifest['files']}\t"
+                      f"перечитано {manifest['read']}\tзаписано {manifest['stored_bytes']} байт")
+            return 0
+        if args.prune is not None:
+            if args.prune < 1:
+                print("❌ --prune должен быть не меньше 1")
+                return 1
+            print(f"🧹 Удалено объектов: {snapshot_store.prune(args.prune)}")
+            return 0
+        manifest = snapshot_store.create()
+    except (OSError, ValueError, TimeoutError) as e:
+        print(f"❌ Ошибка снимка: {e}")
+        return 1
+    if manifest is None:
+        print("⏳ Снимок уже делается другим процессом.")
+        return 1
+    if manifest.get('unchanged'):
+        print(f"✅ Изменений нет, актуален снимок {manifest['id']} от {manifest['created']}")
+        return 0
+    print(f"✅ Снимок {manifest['id']} за {manifest['seconds']} с: файлов {manifest['files']}, "
+          f"перечитано {manifest['read']}, записано {manifest['stored_bytes']} байт")
+    return 0
+
+def run_restore_cli(args):
+    """Восстановление user_data (всех или одного пользователя) из снимка"""
+    try:
+        at = datetime.fromisoformat(args.at) if args.at else None
+        manifest = snapshot_store.find(args.id, at)
+        restored, removed = snapshot_store.restore(manifest, args.user, args.target, args.allow_empty)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"❌ Ошибка восстановления: {e}")
+        return 1
+    who = f"пользователя {args.user}" if args.user is not None else "всех пользователей"
+    print(f"✅ Восстановлено файлов {who}: {restored}, удалено созданных после снимка: {removed} "
+          f"(снимок {manifest['id']} от {manifest['created']})")
+    return 0
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="UnlockCode — Telegram-бот и утилиты хранилища паролей")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("BOT_WORKERS", "1")),
+                        help="Число процессов-воркеров (больше 1 — режим с диспетчером)")
+    parser.add_argument("--api-url", default=os.getenv("TELEGRAM_API_URL"),
+                        help="Базовый URL Bot API, например http://127.0.0.1:8081/bot (по умолчанию api.telegram.org)")
+    parser.add_argument("--webhook-url", default=os.getenv("TELEGRAM_WEBHOOK_URL"),
+                        help="Получать обновления через webhook по этому URL вместо long polling")
+    parser.add_argument("--webhook-port", type=int, default=int(os.getenv("TELEGRAM_WEBHOOK_PORT", "8443")),
+                        help="Локальный порт webhook-сервера")
+    commands = parser.add_subparsers(dest="command")
+    
+    import_parser = commands.add_parser("import", help="Импорт паролей из Chrome/Firefox/Bitwarden")
+    import_parser.add_argument("file", help="CSV или JSON файл экспорта")
+    import_parser.add_argument("--user", type=int, default=None, help="Telegram ID владельца хранилища")
+    import_parser.add_argument("--format", default="auto",
+                               choices=["auto", "chrome", "firefox", "bitwarden", "bitwarden_json", "json"])
+    
+    issue_parser = commands.add_parser("issue", help="Выпуск уникальных одноразовых кодов (ваучеры, коды разблокировки)")
+    issue_parser.add_argument("series", help="Имя серии; создается при первом выпуске")
+    issue_parser.add_argument("-n", "--count", type=int, default=1)
+    issue_parser.add_argument("--alphabet", default=None, help=f"Алфавит новой серии (по умолчанию {CODE_ALPHABET})")
+    issue_parser.add_argument("--length", type=int, default=None, help=f"Длина кода новой серии (по умолчанию {CODE_LENGTH})")
+    issue_parser.add_argument("--group", type=int, default=0, help="Разбить код дефисами на группы по N символов")
+    issue_parser.add_argument("--verify", nargs="+", default=None, metavar="CODE", help="Проверить, выдавались ли коды")
+    
+    snapshot_parser = commands.add_parser("snapshot", help=f"Инкрементальный снимок user_data в {SNAPSHOT_DIR}")
+    snapshot_parser.add_argument("--list", action="store_true", help="Показать снимки")
+    snapshot_parser.add_argument("--prune", type=int, default=None, metavar="N",
+                                 help="Оставить N последних снимков и удалить ненужные данные")
+    
+    restore_parser = commands.add_parser(
+        "restore", help="Восстановление файлов пользователей из снимка (бот должен быть остановлен)")
+    restore_parser.add_argument("--id", default=None, help="ID снимка (по умолчанию последний)")
+    restore_parser.add_argument("--at", default=None, help="Последний снимок на момент времени, например 2026-10-19T12:00")
+    restore_parser.add_argument("--user", type=int, default=None, help="Восстановить только этого пользователя")
+    restore_parser.add_argument("--target", default=None, help="Каталог для восстановления (по умолчанию user_data)")
+    restore_parser.add_argument("--allow-empty", action="store_true",
+                                help="Разрешить удалить файлы пользователя, которого нет в снимке (вместе с --user)")
+    return parser
+
 def main():
+    args = build_arg_parser().parse_args()
+    if args.command == "import":
+        sys.exit(run_import_cli(args))
+    if args.command == "issue":
+        sys.exit(run_issue_cli(args))
+    if args.command == "snapshot":
+        sys.exit(run_snapshot_cli(args))
+    if args.command == "restore":
+        sys.exit(run_restore_cli(args))
+    
 #токен для бота
     TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
     
@@ -891,10 +3645,20 @@ def main():
     
 
     os.makedirs("user_data", exist_ok=True)
+    # Блокировка держится до выхода: второй экземпляр и восстановление снимка поверх работающего бота не запустятся
+    bot_lock = UserFileLock(BOT_LOCK_NAME)
+    if not bot_lock.try_acquire():
+        print("❌ Бот уже запущен с этой user_data.")
+        return
     
 #Запуск бота
-    bot = PasswordGeneratorBot(TOKEN)
-    bot.run()
+    if args.workers > 1:
+        if args.webhook_url:
+            logger.warning("Режим с воркерами получает обновления только через long polling, --webhook-url игнорируется")
+        ShardedDispatcher(TOKEN, args.workers, args.api_url).start()
+        return
+    bot = PasswordGeneratorBot(TOKEN, args.api_url)
+    bot.run(args.webhook_url, args.webhook_port)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,634 @@
+import os
+import sys
+import json
+import time
+import email
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import Counter, defaultdict, deque
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qsl
+
+# ==================== НАГРУЗОЧНЫЙ СТЕНД ====================
+# Локальная замена Telegram Bot API + сценарии тысяч пользователей.
+# Бот подключается через --api-url, реальный Telegram не используется:
+#   python loadtest.py --users 2000 --concurrency 300
+#   python loadtest.py --users 500 --mode webhook   # нужен python-telegram-bot[webhooks]
+#   python loadtest.py --no-spawn --port 8081   # бот запущен вручную с --api-url http://127.0.0.1:8081/bot
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bestpswrgen.py")
+FAKE_TOKEN = "123456:LOADTEST"
+FIRST_USER_ID = 7_000_000
+VISIBLE_METHODS = frozenset({'sendMessage', 'editMessageText', 'sendPhoto', 'sendDocument'})
+JSON_FIELDS = frozenset({'reply_markup', 'allowed_updates', 'entities', 'caption_entities', 'commands',
+                         'link_preview_options', 'reply_parameters'})
+INT_FIELDS = frozenset({'chat_id', 'message_id', 'offset', 'limit', 'timeout', 'max_connections'})
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found"}
+
+
+async def read_http_message(reader: asyncio.StreamReader) -> Optional[Tuple[str, Dict[str, str], bytes]]:
+    """Стартовая строка, заголовки и тело HTTP/1.1 (Content-Length или chunked); None при закрытии"""
+    start_line = await reader.readline()
+    if not start_line:
+        return None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        body = b''.join(chunks)
+    else:
+        body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return start_line.decode('latin-1').rstrip('\r\n'), headers, body
+
+
+def parse_api_params(headers: Dict[str, str], body: bytes, query: str) -> dict:
+    """Параметры метода: PTB шлет form-urlencoded (сложные поля — JSON-строками) или multipart"""
+    content_type = headers.get('content-type', '')
+    if content_type.startswith('application/json'):
+        return json.loads(body or b'{}')
+
+    if content_type.startswith('multipart/form-data'):
+        message = email.message_from_bytes(b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n' + body)
+        raw = {}
+        for part in message.get_payload():
+            name = part.get_param('name', header='content-disposition')
+            if name and part.get_filename() is None:
+                raw[name] = part.get_payload(decode=True).decode('utf-8')
+    else:
+        raw = dict(parse_qsl(query))
+        raw.update(parse_qsl(body.decode('utf-8'), keep_blank_values=True))
+
+    params = {}
+    for name, value in raw.items():
+        if name in JSON_FIELDS:
+            value = json.loads(value)
+        elif name in INT_FIELDS:
+            try:
+                value = int(value)
+            except ValueError:
+                pass
+        params[name] = value
+    return params
+
+
+class ApiError(Exception):
+    """Ошибка Bot API, возвращаемая боту как 400 Bad Request"""
+
+
+class FakeBotApi:
+    """Минимальный Bot API: getUpdates (long polling), доставка webhook, отправка и правка сообщений"""
+
+    BOT_USER = {'id': 1, 'is_bot': True, 'first_name': "LoadTestBot", 'username': "loadtest_bot",
+                'can_join_groups': True, 'can_read_all_group_messages': False, 'supports_inline_queries': True}
+
+    def __init__(self, token: str = FAKE_TOKEN, host: str = "127.0.0.1", port: int = 8081):
+        self.token = token
+        self.host = host
+        self.port = port
+        self.webhook_url = None
+        self.webhook_secret = None
+        self.ready = asyncio.Event()  # бот начал получать обновления
+        self.calls = Counter()        # метод -> число вызовов
+        self.api_errors = Counter()   # "метод: описание" -> число ошибок, отданных боту
+        self.webhook_errors = Counter()
+        self._pending = deque()       # обновления для getUpdates
+        self._new_update = asyncio.Event()
+        self._webhook_queue = asyncio.Queue()
+        self._webhook_tasks = []
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self._messages = {}           # (chat_id, message_id) -> сообщение
+        self._outboxes = {}           # chat_id -> asyncio.Queue с ответами бота
+        self._server = None
+
+    @property
+    def api_url(self) -> str:
+        return f"http://{self.host}:{self.port}/bot"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve_connection, self.host, self.port, backlog=1024)
+
+    async def stop(self):
+        for task in self._webhook_tasks:
+            task.cancel()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    # ---------- сторона пользователя ----------
+
+    def subscribe(self, chat_id: int) -> asyncio.Queue:
+        outbox = asyncio.Queue()
+        self._outboxes[chat_id] = outbox
+        return outbox
+
+    def unsubscribe(self, chat_id: int):
+        self._outboxes.pop(chat_id, None)
+
+    def _user(self, user_id: int) -> dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': f"User{user_id}", 'language_code': 'ru'}
+
+    def push_message(self, user_id: int, text: str):
+        message = {'message_id': self._message_id(), 'date': int(time.time()), 'text': text,
+                   'chat': {'id': user_id, 'type': 'private', 'first_name': f"User{user_id}"},
+                   'from': self._user(user_id)}
+        if text.startswith('/'):
+            command = text.split()[0]
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+        self._push({'message': message})
+
+    def push_callback(self, user_id: int, message: dict, data: str):
+        self._push({'callback_query': {'id': str(self._next_update_id), 'from': self._user(user_id),
+                                       'chat_instance': str(user_id), 'message': message, 'data': data}})
+
+    def _message_id(self) -> int:
+        self._next_message_id += 1
+        return self._next_message_id
+
+    def _push(self, update: dict):
+        update['update_id'] = self._next_update_id
+        self._next_update_id += 1
+        if self.webhook_url:
+            self._webhook_queue.put_nowait(update)
+        else:
+            self._pending.append(update)
+            self._new_update.set()
+
+    # ---------- HTTP ----------
+
+    async def _serve_connection(self, reader, writer):
+        try:
+            while True:
+                request = await read_http_message(reader)
+                if request is None:
+                    break
+                start_line, headers, body = request
+                _, target, _ = start_line.split(' ', 2)
+                status, payload = await self._dispatch(target, headers, body)
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                writer.write(f"HTTP/1.1 {status} {HTTP_REASONS.get(status, 'Error')}\r\n"
+                             f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                             f"Connection: keep-alive\r\n\r\n".encode('latin-1') + data)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:  # остановка стенда посреди long polling
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, target: str, headers: Dict[str, str], body: bytes) -> Tuple[int, dict]:
+        parts = urlsplit(target)
+        prefix, _, method = parts.path.lstrip('/').partition('/')
+        if prefix != f"bot{self.token}":
+            return 401, {'ok': False, 'error_code': 401, 'description': "Unauthorized"}
+        self.calls[method] += 1
+        handler = getattr(self, f"_api_{method}", None)
+        if handler is None:  # прочие методы (setMyCommands и т.п.) считаем успешными
+            return 200, {'ok': True, 'result': True}
+        try:
+            result = await handler(parse_api_params(headers, body, parts.query))
+        except ApiError as e:
+            self.api_errors[f"{method}: {e}"] += 1
+            return 400, {'ok': False, 'error_code': 400, 'description': f"Bad Request: {e}"}
+        return 200, {'ok': True, 'result': result}
+
+    # ---------- методы Bot API ----------
+
+    async def _api_getMe(self, params):
+        return self.BOT_USER
+
+    async def _api_getUpdates(self, params):
+        self.ready.set()
+        offset = params.get('offset', 0)
+        while self._pending and self._pending[0]['update_id'] < offset:
+            self._pending.popleft()
+        if not self._pending and params.get('timeout'):
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), params['timeout'])
+            except asyncio.TimeoutError:
+                pass
+        limit = params.get('limit') or 100
+        return [self._pending[i] for i in range(min(limit, len(self._pending)))]
+
+    async def _api_setWebhook(self, params):
+        self.webhook_url = params.get('url') or None
+        self.webhook_secret = params.get('secret_token')
+        for task in self._webhook_tasks:
+            task.cancel()
+        self._webhook_tasks = []
+        if self.webhook_url:
+            # Как и Telegram, доставляем параллельно в пределах max_connections
+            for _ in range(params.get('max_connections') or 40):
+                self._webhook_tasks.append(asyncio.create_task(self._deliver_webhooks()))
+            self.ready.set()
+        return True
+
+    async def _api_deleteWebhook(self, params):
+        return await self._api_setWebhook({})
+
+    async def _api_getWebhookInfo(self, params):
+        return {'url': self.webhook_url or "", 'has_custom_certificate': False,
+                'pending_update_count': len(self._pending) + self._webhook_queue.qsize()}
+
+    async def _api_sendMessage(self, params):
+        return self._store_message('sendMessage', params, text=params.get('text', ""))
+
+    async def _api_sendPhoto(self, params):
+        return self._store_message('sendPhoto', params, photo=[], caption=params.get('caption', ""))
+
+    async def _api_sendDocument(self, params):
+        return self._store_message('sendDocument', params, caption=params.get('caption', ""))
+
+    async def _api_editMessageText(self, params):
+        key = (params.get('chat_id'), params.get('message_id'))
+        message = self._messages.get(key)
+        if message is None:
+            raise ApiError("message to edit not found")
+        markup = params.get('reply_markup')
+        if message.get('text') == params.get('text') and message.get('reply_markup') == markup:
+            raise ApiError("message is not modified")
+        message = dict(message, text=params.get('text', ""), edit_date=int(time.time()))
+        if markup:
+            message['reply_markup'] = markup
+        else:
+            message.pop('reply_markup', None)
+        self._messages[key] = message
+        self._notify('editMessageText', message)
+        return message
+
+    async def _api_deleteMessage(self, params):
+        self._messages.pop((params.get('chat_id'), params.get('message_id')), None)
+        return True
+
+    async def _api_answerCallbackQuery(self, params):
+        return True
+
+    def _store_message(self, method: str, params: dict, **content) -> dict:
+        chat_id = params.get('chat_id')
+        if not isinstance(chat_id, int):
+            raise ApiError("chat not found")
+        message = {'message_id': self._message_id(), 'date': int(time.time()), 'from': self.BOT_USER,
+                   'chat': {'id': chat_id, 'type': 'private', 'first_name': f"User{chat_id}"}, **content}
+        if params.get('reply_markup'):
+            message['reply_markup'] = params['reply_markup']
+        self._messages[(chat_id, message['message_id'])] = message
+        self._notify(method, message)
+        return message
+
+    def _notify(self, method: str, message: dict):
+        outbox = self._outboxes.get(message['chat']['id'])
+        if outbox is not None:
+            outbox.put_nowait((method, message, time.perf_counter()))
+
+    # ---------- доставка webhook ----------
+
+    async def _deliver_webhooks(self):
+        parts = urlsplit(self.webhook_url)
+        host, port = parts.hostname, parts.port or 80
+        request_head = f"POST {parts.path or '/'} HTTP/1.1\r\nHost: {parts.netloc}\r\nContent-Type: application/json\r\n"
+        if self.webhook_secret:
+            request_head += f"X-Telegram-Bot-Api-Secret-Token: {self.webhook_secret}\r\n"
+        reader = writer = None
+        while True:
+            update = await self._webhook_queue.get()
+            data = json.dumps(update, ensure_ascii=False).encode('utf-8')
+            for attempt in range(3):
+                try:
+                    if writer is None:
+                        reader, writer = await asyncio.open_connection(host, port)
+                    writer.write(f"{request_head}Content-Length: {len(data)}\r\n\r\n".encode('latin-1') + data)
+                    await writer.drain()
+                    response = await read_http_message(reader)
+                    if response is None:
+                        raise ConnectionError("соединение закрыто")
+                    status = int(response[0].split(' ', 2)[1])
+                    if status < 300:
+                        break
+                    self.webhook_errors[f"HTTP {status}"] += 1
+                except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                    self.webhook_errors[type(e).__name__] += 1
+                    if writer is not None:
+                        writer.close()
+                    reader = writer = None
+                await asyncio.sleep(0.1 * (attempt + 1))
+
+
+# ==================== СЦЕНАРИИ ====================
+
+class ScenarioError(Exception):
+    """Бот ответил не так, как ожидает сценарий"""
+
+
+class SimulatedUser:
+    """Пользователь, проходящий /start → генерация → сохранение → /get → /transform → /delete"""
+
+    def __init__(self, api: FakeBotApi, user_id: int, stats: "LoadStats", step_timeout: float):
+        self.api = api
+        self.user_id = user_id
+        self.stats = stats
+        self.step_timeout = step_timeout
+        self.outbox = None
+
+    async def run(self, iterations: int):
+        self.outbox = self.api.subscribe(self.user_id)
+        try:
+            for iteration in range(iterations):
+                try:
+                    await self._scenario(f"site-{iteration}")
+                    self.stats.scenarios_ok += 1
+                except (ScenarioError, asyncio.TimeoutError):
+                    self.stats.scenarios_failed += 1
+        finally:
+            self.api.unsubscribe(self.user_id)
+
+    async def _scenario(self, service: str):
+        menu = await self._send("start", "/start")
+        generated = await self._click("generate", menu, "gen_strong")
+        prompt = await self._click("save_click", generated, "save_gen_")
+        if "сервиса" not in prompt.get('text', ""):
+            self._fail("save_click", "нет запроса названия сервиса")
+        await self._send("save_service", service)
+        await self._send("save_login", f"user{self.user_id}@example.com")
+        saved = await self._send("save_notes", "-")
+        if "✅" not in saved.get('text', ""):
+            self._fail("save_notes", "пароль не сохранен")
+        found = await self._send("get", f"/get {service}")
+        if "Найден" not in found.get('text', ""):
+            self._fail("get", "пароль не найден")
+        options = await self._send("transform", "/transform Passw0rd")
+        await self._click("transform_click", options, "transform_leet")
+        await self._send("delete", f"/delete {service}")
+
+    def _fail(self, step: str, reason: str):
+        self.stats.errors[f"{step}: {reason}"] += 1
+        raise ScenarioError(reason)
+
+    async def _send(self, step: str, text: str) -> dict:
+        self._drain()
+        self.api.push_message(self.user_id, text)
+        return await self._await_reply(step, time.perf_counter())
+
+    async def _click(self, step: str, message: dict, data_prefix: str) -> dict:
+        buttons = [button['callback_data'] for row in message.get('reply_markup', {}).get('inline_keyboard', [])
+                   for button in row if 'callback_data' in button]
+        data = next((d for d in buttons if d.startswith(data_prefix)), None)
+        if data is None:
+            self._fail(step, f"нет кнопки {data_prefix}")
+        self._drain()
+        self.api.push_callback(self.user_id, message, data)
+        return await self._await_reply(step, time.perf_counter())
+
+    def _drain(self):
+        # Запоздавшие ответы на предыдущий (упавший по таймауту) шаг не должны засчитываться следующему
+        while not self.outbox.empty():
+            self.outbox.get_nowait()
+
+    async def _await_reply(self, step: str, started: float) -> dict:
+        deadline = started + self.step_timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                method, message, received = await asyncio.wait_for(self.outbox.get(), remaining)
+            except asyncio.TimeoutError:
+                self.stats.errors[f"{step}: таймаут {self.step_timeout:g} с"] += 1
+                raise
+            if method in VISIBLE_METHODS:
+                self.stats.record(step, received - started)
+                return message
+
+
+# ==================== ОТЧЕТ ====================
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Перцентиль по ближайшему рангу для уже отсортированного списка"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def process_tree_rss(pid: int) -> Optional[int]:
+    """Суммарный RSS процесса и его потомков в байтах (Linux /proc); None если недоступно"""
+    total, stack = 0, [pid]
+    try:
+        while stack:
+            current = stack.pop()
+            with open(f"/proc/{current}/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+            for task in os.listdir(f"/proc/{current}/task"):
+                try:
+                    with open(f"/proc/{current}/task/{task}/children") as children:
+                        stack.extend(int(child) for child in children.read().split())
+                except OSError:
+                    pass
+    except (OSError, ValueError):
+        return None
+    return total
+
+
+class LoadStats:
+    """Задержки по шагам, ошибки и RSS процесса бота"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)  # шаг -> секунды
+        self.errors = Counter()
+        self.scenarios_ok = 0
+        self.scenarios_failed = 0
+        self.rss_samples = []
+        self.started = self.finished = 0.0
+
+    def record(self, step: str, seconds: float):
+        self.latencies[step].append(seconds)
+
+    async def sample_rss(self, pid: int, interval: float = 0.5):
+        while True:
+            rss = process_tree_rss(pid)
+            if rss is not None:
+                self.rss_samples.append(rss)
+            await asyncio.sleep(interval)
+
+    def summary(self, api: FakeBotApi) -> dict:
+        elapsed = max(self.finished - self.started, 1e-9)
+        steps = {}
+        all_latencies = []
+        for step, values in self.latencies.items():
+            values.sort()
+            all_latencies.extend(values)
+            steps[step] = self._latency_row(values)
+        all_latencies.sort()
+        completed = len(all_latencies)
+        failed_steps = sum(self.errors.values())
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'scenarios': {'ok': self.scenarios_ok, 'failed': self.scenarios_failed},
+            'steps': {'completed': completed, 'failed': failed_steps,
+                      'per_second': round(completed / elapsed, 1),
+                      'error_rate': round(failed_steps / max(completed + failed_steps, 1), 4)},
+            'api_calls': dict(api.calls),
+            'api_calls_per_second': round(sum(api.calls.values()) / elapsed, 1),
+            'latency_ms': {'all': self._latency_row(all_latencies), **steps},
+            'errors': dict(self.errors),
+            'api_errors': dict(api.api_errors),
+            'webhook_errors': dict(api.webhook_errors),
+            'rss_mb': ({'start': self._mb(self.rss_samples[0]), 'peak': self._mb(max(self.rss_samples)),
+                        'end': self._mb(self.rss_samples[-1])} if self.rss_samples else None),
+        }
+
+    @staticmethod
+    def _latency_row(values: List[float]) -> dict:
+        row = {'n': len(values)}
+        for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p95', 0.95), ('p99', 0.99), ('max', 1.0)):
+            row[name] = round(percentile(values, fraction) * 1000, 1)
+        return row
+
+    @staticmethod
+    def _mb(value: int) -> float:
+        return round(value / 1024 / 1024, 1)
+
+
+def format_report(summary: dict) -> str:
+    lines = [
+        f"⏱  Длительность: {summary['elapsed_s']} с",
+        f"✅ Сценарии: успешно {summary['scenarios']['ok']}, с ошибкой {summary['scenarios']['failed']}",
+        f"📈 Шаги: {summary['steps']['completed']} ({summary['steps']['per_second']}/с), "
+        f"ошибок {summary['steps']['failed']} ({summary['steps']['error_rate']:.2%})",
+        f"📡 Вызовы Bot API: {sum(summary['api_calls'].values())} ({summary['api_calls_per_second']}/с)",
+        "",
+        f"{'Задержка, мс':<16}{'n':>8}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}",
+    ]
+    for step, row in summary['latency_ms'].items():
+        lines.append(f"{step:<16}{row['n']:>8}{row['p50']:>9}{row['p90']:>9}{row['p95']:>9}{row['p99']:>9}{row['max']:>9}")
+    for title, key in (("Ошибки сценариев", 'errors'), ("Ошибки Bot API", 'api_errors'),
+                       ("Ошибки доставки webhook", 'webhook_errors')):
+        if summary[key]:
+            lines.append("")
+            lines.append(f"{title}:")
+            lines.extend(f"  {name}: {count}" for name, count in sorted(summary[key].items(), key=lambda i: -i[1]))
+    rss = summary['rss_mb']
+    lines.append("")
+    lines.append(f"💾 RSS бота: старт {rss['start']} МБ, пик {rss['peak']} МБ, конец {rss['end']} МБ"
+                 if rss else "💾 RSS бота: недоступно")
+    return "\n".join(lines)
+
+
+# ==================== ЗАПУСК ====================
+
+def spawn_bot(args, api: FakeBotApi, workdir: str) -> subprocess.Popen:
+    """Бот в отдельном процессе с чистым user_data во временной папке"""
+    command = [sys.executable, "-u", BOT_SCRIPT, "--api-url", api.api_url, "--workers", str(args.workers)]
+    if args.mode == "webhook":
+        command += ["--webhook-url", f"http://127.0.0.1:{args.webhook_port}/hook",
+                    "--webhook-port", str(args.webhook_port)]
+    env = dict(os.environ, TELEGRAM_BOT_TOKEN=api.token)
+    log = open(os.path.join(workdir, "bot.log"), "wb")
+    return subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT,
+                            stdin=subprocess.DEVNULL)
+
+
+async def run_load_test(args) -> dict:
+    api = FakeBotApi(port=args.port)
+    await api.start()
+    workdir = tempfile.mkdtemp(prefix="unlockcode-load-")
+    bot_process = spawn_bot(args, api, workdir) if not args.no_spawn else None
+    stats = LoadStats()
+    sampler = None
+    try:
+        print(f"🚀 Bot API: {api.api_url}, данные бота: {workdir}")
+        try:
+            await asyncio.wait_for(api.ready.wait(), args.startup_timeout)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"Бот не подключился за {args.startup_timeout} с (лог: {workdir}/bot.log)")
+        bot_pid = bot_process.pid if bot_process else args.bot_pid
+        if bot_pid:
+            sampler = asyncio.create_task(stats.sample_rss(bot_pid))
+
+        slots = asyncio.Semaphore(args.concurrency)
+        ramp_delay = args.ramp / max(args.users, 1)
+
+        async def one_user(index: int):
+            await asyncio.sleep(index * ramp_delay)
+            async with slots:
+                await SimulatedUser(api, FIRST_USER_ID + index, stats, args.step_timeout).run(args.iterations)
+
+        print(f"👥 Пользователей: {args.users}, одновременно: {args.concurrency}, итераций: {args.iterations}")
+        stats.started = time.perf_counter()
+        await asyncio.gather(*(one_user(i) for i in range(args.users)))
+        stats.finished = time.perf_counter()
+        await asyncio.sleep(0.6)  # последний замер RSS после нагрузки
+        return stats.summary(api)
+    finally:
+        if sampler:
+            sampler.cancel()
+        if bot_process:
+            bot_process.terminate()
+            try:
+                bot_process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                bot_process.kill()
+        await api.stop()
+        if bot_process and not args.keep_data:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота UnlockCode на локальном Bot API")
+    parser.add_argument("--users", type=int, default=1000, help="Число имитируемых пользователей")
+    parser.add_argument("--concurrency", type=int, default=200, help="Сколько пользователей активны одновременно")
+    parser.add_argument("--iterations", type=int, default=1, help="Повторов сценария на пользователя")
+    parser.add_argument("--ramp", type=float, default=5.0, help="Секунд на подключение всех пользователей")
+    parser.add_argument("--step-timeout", type=float, default=30.0, help="Ожидание ответа бота на шаг, с")
+    parser.add_argument("--mode", choices=["polling", "webhook"], default="polling")
+    parser.add_argument("--workers", type=int, default=1, help="Воркеры бота (только polling)")
+    parser.add_argument("--port", type=int, default=8081, help="Порт локального Bot API")
+    parser.add_argument("--webhook-port", type=int, default=8443, help="Порт webhook-сервера бота")
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--no-spawn", action="store_true", help="Не запускать бота: он уже запущен с --api-url")
+    parser.add_argument("--bot-pid", type=int, default=None, help="PID внешнего бота для замера RSS")
+    parser.add_argument("--keep-data", action="store_true", help="Не удалять user_data и лог бота")
+    parser.add_argument("--json", dest="json_path", default=None, help="Сохранить отчет в JSON")
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    try:
+        summary = asyncio.run(run_load_test(args))
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print("⏹  Прервано")
+        sys.exit(130)
+    print()
+    print(format_report(summary))
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    sys.exit(1 if summary['scenarios']['failed'] else 0)
+
+
+if __name__ == "__main__":
+    main()
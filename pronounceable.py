@@ -0,0 +1,204 @@
+import os
+import math
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# ==================== ПРОИЗНОСИМЫЕ ПАРОЛИ (ЦЕПИ МАРКОВА) ====================
+# Общий модуль для Telegram-бота (bestpswrgen.py) и консольной версии (Unlock Code.py).
+# Таблицы переходов строятся по словарю один раз и хранятся как накопленные счетчики в array;
+# следующая буква выбирается bisect'ом по равномерному случайному числу из os.urandom.
+
+MARKOV_ORDER = 2  # длина контекста в буквах: 2 — ~2.8 бита на букву при хорошей произносимости
+WORD_START = '^'
+WORD_END = '$'
+PRONOUNCEABLE_DIGITS = "0123456789"
+PRONOUNCEABLE_SYMBOLS = "!@#$%&*?-_+="
+
+# Обучающий словарь по умолчанию: частые английские слова без редких сочетаний букв
+DEFAULT_CORPUS = """
+about above across action after again against agent album alive allow almost alone along already also
+always amber among amount anchor angel animal answer apple april arena argue armor around arrow artist
+autumn avenue balance banana banner barrel basket battle beacon beauty become before begin behind belong
+below better beyond birdsong border bottle bottom branch bread breeze bridge bright broken bronze brother
+bubble bucket budget butter button cabin cactus camera camper canal candle canyon capital captain carbon
+career carpet castle cattle center cereal chance change chapter charter cherry choice circle citizen
+claim clever climate closer clover coastal cobalt coffee colony color combat comet common compass copper
+corner cotton couple courage cousin cradle credit crystal culture current custom dancer danger dawn debate
+decide deliver desert design detail dinner direct doctor dolphin domain double dragon drama dream
+during eager early easel easy echo effort eleven ember empire energy engine enough escape evening
+event ever falcon family famous farmer father feather festival fiber field figure filter final finger
+forest forget formal fortune forward fossil frame friend frozen future galaxy garden garlic gather gentle
+giant ginger glacier global golden gospel gravel ground guitar hammer handle harbor harvest hazel heaven
+helmet hidden hollow honey horizon hunter island jacket jaguar jasmine jelly jewel jungle junior kettle
+kingdom kitchen ladder lagoon lantern laser lemon letter level liberty limit linen lion liquid little
+lizard lobster locket lotus lunar magic magnet maple marble market meadow medal melody memory metal
+method middle minute mirror modern moment monkey motion mountain museum music narrow nature nectar
+needle never noble normal north number ocean october office olive orange orbit order origin outer
+oxygen paddle palace panel paper parade parent parrot pebble pencil people pepper period person piano
+picnic pillow pilot planet plaster pocket poem polar potato powder prairie prison problem puzzle rabbit
+radar radio random rapid raven reason record relic remote rescue ribbon river rocket rosemary rubber
+saddle safari salmon sample sandal saturn season second secret seven shadow shelter silver simple
+singer sister sketch socket soldier spider spirit spring square stable status steady stone storm
+story sugar summer sunset super surface system table talent temple tender tennis thunder ticket tiger
+timber token tomato tonight tower travel treasure tribute tropic tunnel turtle twelve umbrella under
+unit valley velvet venture vessel victor village violet virtue visitor volcano voyage wagon walnut
+water weather whisper window winter wisdom wonder wooden yellow yonder zebra zero
+""".split()
+
+
+class MarkovModel:
+    """Таблицы переходов n-грамм: для каждого контекста — буквы и накопленные счетчики"""
+
+    def __init__(self, words: Iterable[str], order: int = MARKOV_ORDER):
+        if order < 1:
+            raise ValueError("Порядок цепи должен быть не меньше 1")
+        self.order = order
+        counts: Dict[str, Dict[str, int]] = {}
+        trained = 0
+        for word in words:
+            word = ''.join(ch for ch in word.strip().lower() if 'a' <= ch <= 'z')
+            if len(word) < 2:
+                continue
+            trained += 1
+            padded = WORD_START * order + word + WORD_END
+            for i in range(order, len(padded)):
+                successors = counts.setdefault(padded[i - order:i], {})
+                successors[padded[i]] = successors.get(padded[i], 0) + 1
+        if not trained:
+            raise ValueError("В словаре нет слов для обучения")
+        self.words_trained = trained
+
+        # Плоские массивы: переходы контекста i лежат в [offsets[i], offsets[i + 1])
+        self.contexts: Dict[str, int] = {}
+        self.offsets = array('I', [0])
+        self.cumulative = array('I')
+        self.surprisal = array('d')  # -log2 p для каждого перехода, считается один раз
+        symbols: List[str] = []
+        for context, successors in sorted(counts.items()):
+            self.contexts[context] = len(self.contexts)
+            total = sum(successors.values())
+            running = 0
+            for symbol, count in sorted(successors.items()):
+                running += count
+                symbols.append(symbol)
+                self.cumulative.append(running)
+                self.surprisal.append(math.log2(total / count))
+            self.offsets.append(len(symbols))
+        self.symbols = ''.join(symbols)
+        self.start = self.contexts[WORD_START * order]
+        # Номер следующего контекста для каждого перехода: при генерации нет склейки строк и поиска в dict
+        self.next_context = array('I', [0] * len(symbols))
+        for context, index in self.contexts.items():
+            for j in range(self.offsets[index], self.offsets[index + 1]):
+                ch = symbols[j]
+                self.next_context[j] = self.start if ch == WORD_END else self.contexts[(context + ch)[-order:]]
+
+
+class RandomBelow:
+    """Равномерные целые из os.urandom пачками по 32 бита с отбраковкой (без смещения по модулю)"""
+
+    def __init__(self, batch: int = 4096):
+        self.batch = batch
+        self._values = array('I')
+        self._pos = 0
+
+    def refill(self) -> Tuple[array, int]:
+        self._values = array('I')
+        self._values.frombytes(os.urandom(4 * self.batch))
+        self._pos = 0
+        return self._values, 0
+
+    def take(self) -> Tuple[array, int]:
+        """Буфер и позиция для горячих циклов; после использования вернуть через give_back"""
+        return self._values, self._pos
+
+    def give_back(self, values: array, pos: int):
+        self._values, self._pos = values, pos
+
+    def __call__(self, n: int) -> int:
+        limit = (1 << 32) - (1 << 32) % n
+        while True:
+            if self._pos >= len(self._values):
+                self.refill()
+            value = self._values[self._pos]
+            self._pos += 1
+            if value < limit:
+                return value % n
+
+
+class PronounceableGenerator:
+    """Произносимые пароли: слоги по цепи Маркова, новое «слово» — с заглавной буквы.
+
+    Заглавные буквы однозначно отмечают границы слов, поэтому у пароля ровно один путь генерации
+    и его энтропия (-log2 вероятности) считается точно: сумма по переходам плюс цифры и символ.
+    """
+
+    def __init__(self, model: MarkovModel = None):
+        self.model = model or default_model()
+        self.random_below = RandomBelow()
+
+    def generate(self, length: int = 12, digits: int = 2, symbol: bool = False) -> Tuple[str, float]:
+        """Пароль длины length и его точная энтропия в битах"""
+        return next(self.batch(1, length, digits, symbol))
+
+    def batch(self, count: int, length: int = 12, digits: int = 2, symbol: bool = False) -> Iterator[Tuple[str, float]]:
+        """Пары (пароль, энтропия в битах); горячий цикл без вызовов функций на каждую букву"""
+        letters_total = length - digits - (1 if symbol else 0)
+        if letters_total < 1:
+            raise ValueError("Длина должна быть больше числа цифр и символов")
+        model = self.model
+        random_below = self.random_below
+        offsets, cumulative, surprisal = model.offsets, model.cumulative, model.surprisal
+        symbols, next_context, start = model.symbols, model.next_context, model.start
+        suffix_bits = digits * math.log2(len(PRONOUNCEABLE_DIGITS))
+        if symbol:
+            suffix_bits += math.log2(len(PRONOUNCEABLE_SYMBOLS))
+        values, pos = random_below.take()
+
+        for _ in range(count):
+            parts = []
+            bits = suffix_bits
+            context = start
+            new_word = True
+            letters = letters_total
+            while letters:
+                lo, hi = offsets[context], offsets[context + 1]
+                total = cumulative[hi - 1]
+                limit = 4294967296 - 4294967296 % total
+                while True:  # то же, что RandomBelow, но без вызова на каждую букву
+                    if pos >= len(values):
+                        values, pos = random_below.refill()
+                    value = values[pos]
+                    pos += 1
+                    if value < limit:
+                        break
+                j = bisect_right(cumulative, value % total, lo, hi)
+                bits += surprisal[j]
+                ch = symbols[j]
+                context = next_context[j]
+                if ch == WORD_END:
+                    new_word = True
+                    continue
+                parts.append(ch.upper() if new_word else ch)
+                new_word = False
+                letters -= 1
+
+            random_below.give_back(values, pos)
+            for _ in range(digits):
+                parts.append(PRONOUNCEABLE_DIGITS[random_below(len(PRONOUNCEABLE_DIGITS))])
+            if symbol:
+                parts.append(PRONOUNCEABLE_SYMBOLS[random_below(len(PRONOUNCEABLE_SYMBOLS))])
+            values, pos = random_below.take()
+            yield ''.join(parts), bits
+
+
+_default_model: Optional[MarkovModel] = None
+
+
+def default_model() -> MarkovModel:
+    """Модель по встроенному словарю; обучается при первом обращении"""
+    global _default_model
+    if _default_model is None:
+        _default_model = MarkovModel(DEFAULT_CORPUS)
+    return _default_model
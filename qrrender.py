@@ -0,0 +1,120 @@
+import io
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+# ==================== QR-КОДЫ В ПАМЯТИ ====================
+# Общий модуль для Telegram-бота (bestpswrgen.py) и GUI (result.md):
+# PNG рендерится в BytesIO, без временных файлов на диске
+
+# Проверка QR-библиотек: qrcode (с PIL или pypng) или pyqrcode + pypng
+QR_BACKEND = None
+try:
+    import qrcode
+    try:
+        from qrcode.image.pil import PilImage as _QrImageFactory
+    except ImportError:
+        from qrcode.image.pure import PyPNGImage as _QrImageFactory
+    QR_BACKEND = "qrcode"
+except ImportError:
+    try:
+        import pyqrcode
+        import png  # noqa: F401 - pyqrcode пишет PNG через pypng
+        QR_BACKEND = "pyqrcode"
+    except ImportError:
+        pass
+QR_AVAILABLE = QR_BACKEND is not None
+
+QR_CACHE_SIZE = 64    # готовых PNG в памяти
+QR_WORKERS = 2        # потоков рендеринга
+QR_DEFAULT_SCALE = 8  # пикселей на модуль
+QR_DEFAULT_BORDER = 2  # модулей белой рамки
+
+
+def _escape_wifi(value: str) -> str:
+    for ch in '\\;,:"':
+        value = value.replace(ch, '\\' + ch)
+    return value
+
+
+def wifi_payload(ssid: str, password: str = "", security: str = "WPA", hidden: bool = False) -> str:
+    """Строка WIFI: для подключения к сети сканированием QR"""
+    security = security.upper() if password else "nopass"
+    payload = f"WIFI:T:{security};S:{_escape_wifi(ssid)};"
+    if password:
+        payload += f"P:{_escape_wifi(password)};"
+    if hidden:
+        payload += "H:true;"
+    return payload + ";"
+
+
+class QrRenderer:
+    """PNG-рендеринг QR с LRU-кэшем по хешу содержимого; тяжелая работа уходит в пул потоков"""
+
+    def __init__(self, cache_size: int = QR_CACHE_SIZE, workers: int = QR_WORKERS):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # sha256(параметры + содержимое) -> PNG
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qr")
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(payload: str, scale: int, border: int) -> bytes:
+        # В ключе не хранится сам секрет — только его хеш
+        return hashlib.sha256(f"{scale}:{border}:{payload}".encode('utf-8')).digest()
+
+    def cached(self, payload: str, scale: int = QR_DEFAULT_SCALE, border: int = QR_DEFAULT_BORDER) -> Optional[bytes]:
+        key = self._key(payload, scale, border)
+        with self._lock:
+            png_bytes = self._cache.get(key)
+            if png_bytes is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            return png_bytes
+
+    def render_png(self, payload: str, scale: int = QR_DEFAULT_SCALE, border: int = QR_DEFAULT_BORDER) -> bytes:
+        """PNG-байты QR-кода; RuntimeError если QR-библиотека не установлена"""
+        png_bytes = self.cached(payload, scale, border)
+        if png_bytes is not None:
+            return png_bytes
+        if not QR_AVAILABLE:
+            raise RuntimeError("QR недоступен: pip install qrcode[pil] или pyqrcode pypng")
+
+        buffer = io.BytesIO()
+        if QR_BACKEND == "qrcode":
+            qr = qrcode.QRCode(box_size=scale, border=border,
+                               error_correction=qrcode.constants.ERROR_CORRECT_M)
+            qr.add_data(payload)
+            qr.make(fit=True)
+            qr.make_image(image_factory=_QrImageFactory).save(buffer)
+        else:
+            pyqrcode.create(payload, error='M', encoding='utf-8').png(buffer, scale=scale, quiet_zone=border)
+        png_bytes = buffer.getvalue()
+
+        key = self._key(payload, scale, border)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = png_bytes
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return png_bytes
+
+    async def render_png_async(self, payload: str, scale: int = QR_DEFAULT_SCALE,
+                               border: int = QR_DEFAULT_BORDER) -> bytes:
+        """То же в пуле потоков, чтобы не блокировать цикл событий бота"""
+        png_bytes = self.cached(payload, scale, border)
+        if png_bytes is not None:
+            return png_bytes
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.render_png, payload, scale, border)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+qr_renderer = QrRenderer()
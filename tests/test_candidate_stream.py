@@ -0,0 +1,19 @@
+import importlib.util
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parent.parent / "Unlock Code.py"
+spec = importlib.util.spec_from_file_location("unlock_code", SCRIPT)
+unlock_code = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(unlock_code)
+
+
+def test_duplicates_between_word_sources_are_skipped():
+    stream = unlock_code.CandidateStream().add_words(["a", "b"]).add_words(["b", "c"])
+    assert list(stream) == ["a", "b", "c"]
+    assert stream.duplicates == 1
+
+
+def test_dedup_memory_is_capped():
+    stream = unlock_code.CandidateStream(max_seen=2).add_words(["a", "b", "c"]).add_words(["a", "b", "c"])
+    # Запомнены только первые два варианта — третий повторяется
+    assert list(stream) == ["a", "b", "c", "c"]
@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+pytest.importorskip("telegram")
+from bestpswrgen import CodeSeries, FeistelPermutation  # noqa: E402
+
+
+@pytest.mark.parametrize("n", [2, 3, 10, 97, 1000, 4097])
+def test_feistel_is_bijection(n):
+    permutation = FeistelPermutation(n, b"k" * 32)
+    images = [permutation.encrypt(x) for x in range(n)]
+    assert sorted(images) == list(range(n))
+    assert [permutation.decrypt(y) for y in images] == list(range(n))
+
+
+def test_feistel_depends_on_key():
+    a = FeistelPermutation(1000, b"a" * 32)
+    b = FeistelPermutation(1000, b"b" * 32)
+    assert [a.encrypt(x) for x in range(50)] != [b.encrypt(x) for x in range(50)]
+
+
+def test_issued_codes_are_unique_and_verify(tmp_path):
+    series = CodeSeries("test", alphabet="ABCDEFGH", length=3, storage_dir=str(tmp_path))
+    codes = list(series.issue(200)) + list(series.issue(100))
+    assert len(set(codes)) == 300
+    assert all(len(code) == 3 and set(code) <= set("ABCDEFGH") for code in codes)
+    assert [series.verify(code) for code in codes] == list(range(300))
+    # Тот же номер из другого объекта серии (другого процесса) дает тот же код
+    assert CodeSeries("test", storage_dir=str(tmp_path)).verify(CodeSeries.format_code(codes[5], 1)) == 5
+
+
+def test_unissued_code_does_not_verify(tmp_path):
+    series = CodeSeries("test", alphabet="0123456789", length=4, storage_dir=str(tmp_path))
+    series.issue(10)
+    assert series.verify(series.code_at(9)) == 9
+    assert series.verify(series.code_at(10)) is None
+    assert series.verify("XYZW") is None
+    assert series.verify("123") is None
+
+
+def test_exhaustion_is_all_or_nothing(tmp_path):
+    series = CodeSeries("tiny", alphabet="ab", length=1, storage_dir=str(tmp_path))
+    with pytest.raises(ValueError):
+        series.issue(3)
+    assert series.issued() == 0
+    assert sorted(series.issue(2)) == ["a", "b"]
+    with pytest.raises(ValueError):
+        series.issue(1)
+
+
+def test_verify_does_not_create_unknown_series(tmp_path):
+    with pytest.raises(ValueError):
+        CodeSeries("typo", storage_dir=str(tmp_path), create=False)
+    assert not os.path.exists(tmp_path / "codes" / "typo.json")
+
+
+def test_existing_series_rejects_other_alphabet(tmp_path):
+    CodeSeries("test", alphabet="ABCD", length=4, storage_dir=str(tmp_path))
+    with pytest.raises(ValueError):
+        CodeSeries("test", alphabet="WXYZ", length=4, storage_dir=str(tmp_path))
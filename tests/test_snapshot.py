@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip("telegram")
+from bestpswrgen import SnapshotStore  # noqa: E402
+
+
+@pytest.fixture
+def store(tmp_path):
+    data_dir = tmp_path / "user_data"
+    data_dir.mkdir()
+    (data_dir / "passwords_1.json").write_text('{"a": 1}', encoding="utf-8")
+    return SnapshotStore(str(data_dir), str(tmp_path / "snapshots"))
+
+
+def test_restore_single_user_rolls_back_files(store, tmp_path):
+    manifest = store.create()
+    (tmp_path / "user_data" / "passwords_1.json").write_text('{"a": 2}', encoding="utf-8")
+    assert store.restore(manifest, 1, str(tmp_path / "user_data")) == (1, 0)
+    assert (tmp_path / "user_data" / "passwords_1.json").read_text(encoding="utf-8") == '{"a": 1}'
+
+
+def test_restore_single_user_missing_from_snapshot_keeps_vault(store, tmp_path):
+    manifest = store.create()
+    vault = tmp_path / "user_data" / "passwords_2.json"
+    vault.write_text('{"b": 1}', encoding="utf-8")
+    with pytest.raises(ValueError):
+        store.restore(manifest, 2, str(tmp_path / "user_data"))
+    assert vault.exists()
+    assert store.restore(manifest, 2, str(tmp_path / "user_data"), allow_empty=True) == (0, 1)
+    assert not vault.exists()
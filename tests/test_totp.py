@@ -0,0 +1,54 @@
+import base64
+
+import pytest
+
+pytest.importorskip("telegram")
+from bestpswrgen import TotpEngine  # noqa: E402
+
+# RFC 6238, приложение B: секреты — ASCII "1234567890", повторенные до длины ключа алгоритма
+SECRETS = {
+    'SHA1': b"12345678901234567890",
+    'SHA256': b"12345678901234567890123456789012",
+    'SHA512': b"1234567890123456789012345678901234567890123456789012345678901234",
+}
+VECTORS = [
+    (59, {'SHA1': "94287082", 'SHA256': "46119246", 'SHA512': "90693936"}),
+    (1111111109, {'SHA1': "07081804", 'SHA256': "68084774", 'SHA512': "25091201"}),
+    (1111111111, {'SHA1': "14050471", 'SHA256': "67062674", 'SHA512': "99943326"}),
+    (1234567890, {'SHA1': "89005924", 'SHA256': "91819424", 'SHA512': "93441116"}),
+    (2000000000, {'SHA1': "69279037", 'SHA256': "90698825", 'SHA512': "38618901"}),
+    (20000000000, {'SHA1': "65353130", 'SHA256': "77737706", 'SHA512': "47863826"}),
+]
+
+
+def uri(algorithm, digits=8, period=30):
+    secret = base64.b32encode(SECRETS[algorithm]).decode('ascii').rstrip('=')
+    return f"otpauth://totp/test?secret={secret}&algorithm={algorithm}&digits={digits}&period={period}"
+
+
+@pytest.mark.parametrize("now, expected", VECTORS)
+@pytest.mark.parametrize("algorithm", sorted(SECRETS))
+def test_rfc6238_vectors(algorithm, now, expected):
+    code, seconds_left = TotpEngine().code(uri(algorithm), now)
+    assert code == expected[algorithm]
+    assert 0 < seconds_left <= 30
+
+
+def test_codes_for_many_services_match_single_code():
+    engine = TotpEngine()
+    uris = {algorithm: uri(algorithm) for algorithm in SECRETS}
+    codes = engine.codes(uris, 1111111109)
+    assert {name: code for name, (code, _) in codes.items()} == VECTORS[1][1]
+
+
+@pytest.mark.parametrize("digits, period", [(0, 30), (-1, 30), (5, 30), (11, 30), (6, 0), (6, -30)])
+def test_invalid_digits_or_period_rejected(digits, period):
+    with pytest.raises(ValueError):
+        TotpEngine.build_uri("test", uri('SHA1', digits, period))
+
+
+def test_bad_uri_does_not_break_other_codes():
+    engine = TotpEngine()
+    codes = engine.codes({'bad': uri('SHA1', period=0), 'good': uri('SHA1')}, 59)
+    assert list(codes) == ['good']
+    assert codes['good'][0] == "94287082"
@@ -0,0 +1,47 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SCRIPT = Path(__file__).resolve().parent.parent / "Unlock Code.py"
+
+
+def run_cli(*args):
+    return subprocess.run([sys.executable, str(SCRIPT), *args], capture_output=True, text=True,
+                          encoding="utf-8", timeout=60)
+
+
+def test_generate_zero_length_is_rejected():
+    # -l 0 — явно заданная длина, а не «длина политики»
+    result = run_cli("generate", "-l", "0")
+    assert result.returncode == 2
+    assert result.stdout == ""
+
+
+def test_generate_without_length_uses_policy_default():
+    result = run_cli("generate", "-p", "digits", "-n", "3")
+    assert result.returncode == 0
+    assert [len(line) for line in result.stdout.splitlines()] == [6, 6, 6]
+
+
+@pytest.mark.parametrize("content", ["", "  \n\n\t\n"])
+def test_passphrase_empty_wordlist_is_rejected(tmp_path, content):
+    wordlist = tmp_path / "words.txt"
+    wordlist.write_text(content, encoding="utf-8")
+    result = run_cli("passphrase", "--wordlist", str(wordlist))
+    assert result.returncode == 2
+    assert "Traceback" not in result.stderr
+    assert result.stdout == ""
+
+
+def test_passphrase_zero_words_is_rejected():
+    result = run_cli("passphrase", "-k", "0")
+    assert result.returncode == 2
+    assert result.stdout == ""
+
+
+def test_passphrase_uses_requested_word_count():
+    result = run_cli("passphrase", "-n", "3", "-k", "5", "--separator", " ")
+    assert result.returncode == 0
+    assert [len(line.split(" ")) for line in result.stdout.splitlines()] == [5, 5, 5]
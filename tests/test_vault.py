@@ -0,0 +1,87 @@
+import base64
+
+import pytest
+
+pytest.importorskip("telegram")
+import bestpswrgen  # noqa: E402
+from bestpswrgen import VaultCrypto, VaultKeyCache  # noqa: E402
+
+FAST_KDF = {'name': 'pbkdf2', 'salt': '00' * 16, 'iterations': 1000}
+
+
+def tamper(token: str, index: int) -> str:
+    raw = bytearray(base64.urlsafe_b64decode(token))
+    raw[index] ^= 0x01
+    return base64.urlsafe_b64encode(bytes(raw)).decode('ascii')
+
+
+@pytest.mark.parametrize("plaintext", [b"", b"p", "пароль".encode("utf-8"), bytes(range(256)) * 5])
+def test_seal_open_round_trip(plaintext):
+    crypto = VaultCrypto(VaultCrypto.derive_key("master", FAST_KDF))
+    token = crypto.seal(plaintext, b"github")
+    assert crypto.open(token, b"github") == plaintext
+    # Одинаковый текст шифруется с новым nonce
+    assert crypto.seal(plaintext, b"github") != token
+
+
+def test_key_is_reproducible_from_password():
+    token = VaultCrypto(VaultCrypto.derive_key("master", FAST_KDF)).seal(b"secret")
+    assert VaultCrypto(VaultCrypto.derive_key("master", FAST_KDF)).open(token) == b"secret"
+
+
+def test_wrong_key_is_rejected():
+    token = VaultCrypto(VaultCrypto.derive_key("master", FAST_KDF)).seal(b"secret")
+    assert VaultCrypto(VaultCrypto.derive_key("Master", FAST_KDF)).open(token) is None
+    other_salt = dict(FAST_KDF, salt='01' * 16)
+    assert VaultCrypto(VaultCrypto.derive_key("master", other_salt)).open(token) is None
+
+
+@pytest.mark.parametrize("index", [0, VaultCrypto.NONCE_SIZE, -1])
+def test_tampered_token_is_rejected(index):
+    crypto = VaultCrypto(b"k" * 32)
+    token = crypto.seal(b"secret")
+    # Порча nonce, шифротекста или тега
+    assert crypto.open(tamper(token, index)) is None
+
+
+def test_aad_binds_record_to_service():
+    crypto = VaultCrypto(b"k" * 32)
+    token = crypto.seal(b"secret", b"github")
+    assert crypto.open(token, b"gitlab") is None
+
+
+@pytest.mark.parametrize("token", ["", "not base64!", "AAAA", "яяя"])
+def test_malformed_token_is_rejected(token):
+    assert VaultCrypto(b"k" * 32).open(token) is None
+
+
+def test_key_cache_expires_after_idle(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(bestpswrgen.time, "monotonic", lambda: now[0])
+    cache = VaultKeyCache(ttl=10)
+    crypto = VaultCrypto(b"k" * 32)
+    cache.put("vault", crypto)
+    now[0] += 9
+    # Обращение продлевает сессию
+    assert cache.get("vault") is crypto
+    now[0] += 9
+    assert cache.get("vault") is crypto
+    now[0] += 10
+    assert cache.get("vault") is None
+    assert cache.names() == []
+
+
+def test_key_cache_drop_and_handoff(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(bestpswrgen.time, "monotonic", lambda: now[0])
+    cache, other = VaultKeyCache(ttl=10), VaultKeyCache(ttl=10)
+    crypto = VaultCrypto(b"k" * 32)
+    cache.put("vault", crypto)
+    now[0] += 4
+    taken, ttl_left = cache.take("vault")
+    assert taken is crypto and ttl_left == 6
+    assert cache.get("vault") is None
+    other.adopt("vault", taken, ttl_left)
+    assert other.get("vault") is crypto
+    other.drop("vault")
+    assert other.get("vault") is None